@@ -0,0 +1,234 @@
+"""
+Нагрузочный стенд рантаймов бота: настоящие хендлеры telegram_bot (ORM,
+тексты, клавиатуры) против поддельного Bot API, который отвечает с задержкой
+latency мс на каждый вызов.
+
+Запуск (в отдельной тестовой БД, рабочие данные не трогаются; нужен PostgreSQL —
+хендлеры работают из нескольких потоков, а тестовая SQLite живёт в памяти одного
+соединения):
+
+    python -m benchmarks.bot_load --chats 300 --updates-per-chat 5 --latency-ms 50
+
+Сравниваются:
+  - serial — один поток, как infinity_polling с threaded=False;
+  - telebot_threaded — пул TeleBot по умолчанию (2 потока, порядок в чате не гарантирован);
+  - threaded — tgbot.threaded.ThreadedRuntime (полосы чатов + пул потоков).
+Лимитер отправки (habits.ratelimit) на время замера снят: меряется рантайм, а не
+лимиты Telegram. Для каждого режима проверяется порядок апдейтов внутри чата.
+Результат — JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import django
+import requests
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import close_old_connections, connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from telebot import apihelper  # noqa: E402
+from telebot.types import Update  # noqa: E402
+
+import telegram_bot  # noqa: E402
+from habits.models import Habit  # noqa: E402
+from habits.ratelimit import MemoryBuckets, RateLimiter  # noqa: E402
+from tgbot.threaded import ThreadedRuntime  # noqa: E402
+from tgbot.users import user_cache  # noqa: E402
+
+from .scheduler import RESULTS_DIR, _git_commit  # noqa: E402
+
+
+class FakeBotApi:
+    """Сессия requests для telebot: каждый вызов Bot API «идёт» latency секунд и удаётся."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def request(self, method, url, params=None, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+        api_method = url.rsplit("/", 1)[-1]
+        if api_method in ("sendMessage", "editMessageText"):
+            chat_id = int((params or {}).get("chat_id") or 0)
+            result = {"message_id": 1, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": ""}
+        else:
+            result = True
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps({"ok": True, "result": result}).encode()
+        return response
+
+
+def make_chats(chats, habits_per_chat):
+    """Пользователи бота (username = chat_id) с привычками; возвращает {chat_id: [habit_id, ...]}."""
+    User = get_user_model()
+    habits = {}
+    for chat_id in range(1, chats + 1):
+        user = User.objects.create(username=str(chat_id), telegram_chat_id=chat_id, language="en", timezone="UTC")
+        habits[chat_id] = [
+            Habit.objects.create(user=user, time=f"{8 + i:02d}:00", action=f"habit {i}", periodicity_days=1).id
+            for i in range(habits_per_chat)
+        ]
+    return habits
+
+
+def make_updates(habits, per_chat, seed):
+    """
+    Апдейты вперемешку между чатами, внутри чата — по возрастанию message_id:
+    кнопка «мои привычки» (список одной страницей) и /done_N (условный check-in).
+    """
+    rnd = random.Random(seed)
+    order = [chat for chat in habits for _ in range(per_chat)]
+    rnd.shuffle(order)
+    seq = dict.fromkeys(habits, 0)
+    info = telegram_bot.t(None, "menu_info")
+    updates = []
+    for update_id, chat_id in enumerate(order, start=1):
+        seq[chat_id] += 1
+        text = info if rnd.random() < 0.5 else f"/done_{rnd.choice(habits[chat_id])}"
+        updates.append(Update.de_json({
+            "update_id": update_id,
+            "message": {
+                "message_id": seq[chat_id],
+                "date": 0,
+                "chat": {"id": chat_id, "type": "private"},
+                "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+                "text": text,
+            },
+        }))
+    return updates
+
+
+class Recorder:
+    """Обработка апдейта хендлерами бота с записью порядка по чатам."""
+
+    def __init__(self):
+        self.seen = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, update):
+        with self._lock:
+            self.seen.setdefault(update.message.chat.id, []).append(update.message.message_id)
+        try:
+            telegram_bot.bot.process_new_updates([update])
+        finally:
+            close_old_connections()
+
+    def ordered(self):
+        return all(seqs == sorted(seqs) for seqs in self.seen.values())
+
+
+def run_serial(updates, handler):
+    for update in updates:
+        handler(update)
+
+
+def run_threaded(updates, handler, workers=2):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(handler, updates))
+
+
+def run_runtime(updates, handler, workers, max_pending):
+    runtime = ThreadedRuntime(handler, workers=workers, max_pending=max_pending)
+
+    async def main():
+        await runtime.accept(updates)
+        await runtime.drain()
+
+    try:
+        asyncio.run(main())
+    finally:
+        runtime.close()
+
+
+def measure(name, runner, updates, api):
+    # одинаковые стартовые условия: ни одной отметки, пустой кэш пользователей
+    Habit.objects.update(last_performed_at=None)
+    Habit.objects.all().resync_schedule()
+    user_cache.clear()
+    handler = Recorder()
+    calls = api.calls
+    started = time.perf_counter()
+    runner(updates, handler)
+    elapsed = time.perf_counter() - started
+    return {
+        "runtime": name,
+        "updates": len(updates),
+        "api_calls": api.calls - calls,
+        "wall_seconds": round(elapsed, 3),
+        "updates_per_second": round(len(updates) / elapsed, 1),
+        "per_chat_order_kept": handler.ordered(),
+    }
+
+
+def run(args):
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    api = FakeBotApi(args.latency_ms / 1000)
+    unlimited = RateLimiter(MemoryBuckets(), global_rate=10**9, global_burst=10**9, chat_rate=10**9,
+                            chat_burst=10**9, interactive_reserve=0)
+    try:
+        habits = make_chats(args.chats, args.habits_per_chat)
+        updates = make_updates(habits, args.updates_per_chat, args.seed)
+        runners = [
+            ("telebot_threaded", run_threaded),
+            ("threaded", lambda u, h: run_runtime(u, h, args.workers, args.max_pending)),
+        ]
+        if not args.skip_serial:
+            runners.insert(0, ("serial", run_serial))
+        telegram_bot.bot.threaded = False
+        with mock.patch.object(apihelper, "_get_req_session", lambda: api), \
+                mock.patch("habits.ratelimit._limiter", unlimited):
+            return [measure(name, runner, updates, api) for name, runner in runners]
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chats", type=int, default=300)
+    parser.add_argument("--habits-per-chat", type=int, default=3)
+    parser.add_argument("--updates-per-chat", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--skip-serial", action="store_true", help="serial при больших объёмах идёт долго")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    report = {
+        "commit": _git_commit(),
+        "params": vars(args) | {"output": str(args.output) if args.output else None},
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"bot-load-{report['commit'][:10]}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    for r in results:
+        print(
+            f"{r['runtime']:18} {r['wall_seconds']:>8.2f}s {r['updates_per_second']:>9.1f} upd/s "
+            f"api={r['api_calls']} order={'ok' if r['per_chat_order_kept'] else 'BROKEN'}"
+        )
+    print(f"saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
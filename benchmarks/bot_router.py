@@ -0,0 +1,112 @@
+"""
+Микробенчмарк маршрутизации сообщений бота: сколько сообщений в секунду
+раскладывается по хендлерам, без БД и Telegram.
+
+    python -m benchmarks.bot_router --messages 200000
+
+Сравниваются:
+  - if_chain — прежняя схема: два прогона регулярки /done_ в фильтрах
+    хендлеров и цепочка сравнений с t(user, key) для каждого пункта меню;
+  - router — tgbot.router.Router из telegram_bot (один поиск в словаре).
+Результат — JSON в benchmarks/results/.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+os.environ.setdefault("BOT_TOKEN", "123:bench")
+
+import telegram_bot  # noqa: E402
+
+from .scheduler import RESULTS_DIR, _git_commit  # noqa: E402
+
+MENU_KEYS = ("menu_info", "menu_add", "menu_delete_all", "menu_change_lang")
+DONE_RE = r"^/done_\d+$"
+
+
+def make_messages(count, seed):
+    """Сообщения пользователей на разных языках: кнопки меню, /done_N и произвольный текст."""
+    rnd = random.Random(seed)
+    langs = ("en", "es", "ru")
+    messages = []
+    for _ in range(count):
+        user = SimpleNamespace(language=rnd.choice(langs))
+        kind = rnd.random()
+        if kind < 0.7:
+            text = telegram_bot.TR[rnd.choice(MENU_KEYS)][user.language]
+        elif kind < 0.85:
+            text = f"/done_{rnd.randint(1, 10_000)}"
+        else:
+            text = "какой-то текст"
+        messages.append((user, text))
+    return messages
+
+
+def route_if_chain(user, text):
+    if re.match(DONE_RE, text):
+        return "done"
+    if re.match(DONE_RE, text):  # фильтр handle_menu_and_flow
+        return "done"
+    for key in MENU_KEYS:
+        if text.strip() == telegram_bot.t(user, key):
+            return key
+    return None
+
+
+def route_router(user, text):
+    if text.startswith("/done_") and telegram_bot.DONE_COMMAND.match(text):
+        return "done"
+    return telegram_bot.router.key_for(text)
+
+
+def measure(name, route, messages, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for user, text in messages:
+            route(user, text)
+        best = min(best, time.perf_counter() - started)
+    return {
+        "router": name,
+        "messages": len(messages),
+        "best_seconds": round(best, 4),
+        "messages_per_second": round(len(messages) / best),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    messages = make_messages(args.messages, args.seed)
+    mismatched = sum(route_if_chain(u, text) != route_router(u, text) for u, text in messages)
+    results = [
+        measure("if_chain", route_if_chain, messages, args.repeat),
+        measure("router", route_router, messages, args.repeat),
+    ]
+    report = {
+        "commit": _git_commit(),
+        "params": vars(args) | {"output": str(args.output) if args.output else None},
+        "mismatched": mismatched,
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"bot-router-{report['commit'][:10]}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    for r in results:
+        print(f"{r['router']:10} {r['best_seconds']:>8.3f}s {r['messages_per_second']:>12,} msg/s")
+    print(f"mismatched={mismatched}, saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""
+Бенчмарк планировщика напоминаний: send_due_habits и notify_overdue
+на синтетических данных.
+
+Запуск (в отдельной тестовой БД, рабочие данные не трогаются):
+
+    python -m benchmarks.scheduler --users 10000 --habits-per-user 100
+    python -m benchmarks.scheduler compare old.json new.json
+
+Для каждой задачи считаются: время, число SQL-запросов, прочитанные строки
+habits_habit (только PostgreSQL, по pg_stat_user_tables), пиковая память
+(tracemalloc) и сообщений в секунду. Результат пишется в JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from datetime import time as dt_time
+from pathlib import Path
+from unittest import mock
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+
+from config.celery import app  # noqa: E402
+from habits import locks, tasks, telegram  # noqa: E402
+from habits.models import Habit, Notification, ScanCheckpoint  # noqa: E402
+from habits.scheduling import fire_minute, schedule_marks, tz_from_name  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Часовые пояса с весами: основная аудитория + разброс по смещениям.
+TIMEZONES = [
+    ("Europe/Madrid", 40),
+    ("Europe/Moscow", 20),
+    ("America/New_York", 10),
+    ("America/Los_Angeles", 8),
+    ("Asia/Tokyo", 8),
+    ("Asia/Kolkata", 6),
+    ("Australia/Sydney", 4),
+    ("UTC", 4),
+]
+PERIODICITIES = ([1] * 6) + [2, 2, 3, 7]
+PEAK_TIME = dt_time(8, 0)
+
+
+class CountingSender:
+    """Заглушка отправителя: ничего не шлёт, только считает сообщения."""
+
+    def __init__(self):
+        self.token = "123:bench"
+        self.messages = 0
+
+    def send_batch(self, messages):
+        self.messages += len(messages)
+        return [telegram.SendResult(chat_id, ok=True, status=200) for chat_id, _ in messages]
+
+
+def generate(users, habits_per_user, peak_share, seed, now, batch_size=5000):
+    """
+    Пользователи в разных часовых поясах, у каждого habits_per_user привычек:
+    доля peak_share — на 08:00 по местному времени, остальные — на случайную минуту.
+    Поля расписания считаются здесь же, т.к. bulk_create не вызывает save().
+    """
+    rnd = random.Random(seed)
+    names, weights = zip(*TIMEZONES)
+    User = get_user_model()
+    User.objects.bulk_create(
+        [
+            User(username=f"bench{i}", telegram_chat_id=10**9 + i, timezone=rnd.choices(names, weights)[0])
+            for i in range(users)
+        ],
+        batch_size=batch_size,
+    )
+
+    pending = []
+    for user in User.objects.filter(username__startswith="bench").only("id", "timezone").iterator():
+        tz = tz_from_name(user.timezone)
+        for j in range(habits_per_user):
+            if rnd.random() < peak_share:
+                at = PEAK_TIME
+            else:
+                minute = rnd.randrange(24 * 60)
+                at = dt_time(minute // 60, minute % 60)
+            periodicity = rnd.choice(PERIODICITIES)
+            last = None if rnd.random() < 0.1 else now - timedelta(seconds=rnd.uniform(0, 10 * 24 * 3600))
+            next_due_at, overdue_at = schedule_marks(last, periodicity, tz, now)
+            pending.append(
+                Habit(
+                    user_id=user.id,
+                    time=at,
+                    action=f"habit {j}",
+                    periodicity_days=periodicity,
+                    last_performed_at=last,
+                    fire_minute=fire_minute(at, tz, now),
+                    next_due_at=next_due_at,
+                    overdue_at=overdue_at,
+                )
+            )
+            if len(pending) >= batch_size:
+                Habit.objects.bulk_create(pending)
+                pending.clear()
+    Habit.objects.bulk_create(pending)
+
+
+def _rows_read():
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        if connection.pg_version >= 150000:
+            cursor.execute("SELECT pg_stat_force_next_flush()")
+        cursor.execute(
+            "SELECT coalesce(seq_tup_read, 0) + coalesce(idx_tup_fetch, 0) "
+            "FROM pg_stat_user_tables WHERE relname = %s",
+            [Habit._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def measure(name, func, now):
+    """Запускает задачу с зафиксированным now и снимает метрики."""
+    sender = CountingSender()
+    before = _rows_read()
+    with mock.patch.object(telegram, "_sender", sender), mock.patch(
+        "django.utils.timezone.now", return_value=now
+    ), CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    after = _rows_read()
+    return {
+        "task": name,
+        "result": result,
+        "wall_seconds": round(elapsed, 4),
+        "queries": len(queries.captured_queries),
+        "rows_scanned": None if before is None or after is None else after - before,
+        "peak_memory_bytes": peak,
+        "messages": sender.messages,
+        "messages_per_second": round(sender.messages / elapsed, 1) if elapsed else None,
+    }
+
+
+def run(args):
+    now = args.now or _peak_now()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+    app.conf.task_always_eager = True
+    locks._backend = locks.MemoryLockBackend()
+    try:
+        started = time.perf_counter()
+        generate(args.users, args.habits_per_user, args.peak_share, args.seed, now)
+        setup_seconds = time.perf_counter() - started
+        if args.catchup:
+            ScanCheckpoint.objects.create(
+                **tasks.WATERMARK, watermark=now.replace(second=0, microsecond=0) - timedelta(minutes=args.catchup)
+            )
+
+        results = [
+            measure("send_due_habits", tasks.send_due_habits, now),
+            measure("notify_overdue", lambda: tasks.notify_overdue(run_key="bench"), now),
+        ]
+        report = {
+            "commit": _git_commit(),
+            "created_at": datetime.now(dt_timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "params": {
+                "users": args.users,
+                "habits_per_user": args.habits_per_user,
+                "habits": Habit.objects.count(),
+                "peak_share": args.peak_share,
+                "seed": args.seed,
+                "now": now.isoformat(),
+                "catchup_minutes": args.catchup,
+                "shards": settings.HABITS_SCAN_SHARDS,
+            },
+            "setup_seconds": round(setup_seconds, 2),
+            "outbox": Notification.objects.count(),
+            "results": results,
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    output = args.output or RESULTS_DIR / f"scheduler-{report['commit'][:10]}-{int(time.time())}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, ensure_ascii=False, default=str))
+    for r in results:
+        print(
+            f"{r['task']:16} {r['wall_seconds']:>9.3f}s {r['queries']:>6} queries "
+            f"{r['peak_memory_bytes'] / 2**20:>8.1f} MiB {r['messages']:>7} msgs"
+        )
+    print(f"saved to {output}")
+
+
+def compare(old_path, new_path):
+    """Печатает изменение метрик между двумя прогонами (по задачам)."""
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    before = {r["task"]: r for r in old["results"]}
+    print(f"{old['commit'][:10]} -> {new['commit'][:10]}")
+    for r in new["results"]:
+        base = before.get(r["task"])
+        if not base:
+            continue
+        for metric in ("wall_seconds", "queries", "rows_scanned", "peak_memory_bytes", "messages_per_second"):
+            a, b = base.get(metric), r.get(metric)
+            if a is None or b is None:
+                continue
+            change = f"{(b - a) / a * 100:+.1f}%" if a else "n/a"
+            print(f"  {r['task']:16} {metric:20} {a:>14} -> {b:>14} ({change})")
+
+
+def _peak_now():
+    """Сегодняшние 08:00 по Мадриду — пик напоминаний в синтетических данных."""
+    madrid = tz_from_name("Europe/Madrid")
+    today = datetime.now(madrid).date()
+    return datetime.combine(today, PEAK_TIME, tzinfo=madrid).astimezone(dt_timezone.utc) + timedelta(seconds=5)
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command")
+    cmp_parser = sub.add_parser("compare", help="сравнить два JSON-отчёта")
+    cmp_parser.add_argument("old")
+    cmp_parser.add_argument("new")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--habits-per-user", type=int, default=100)
+    parser.add_argument("--peak-share", type=float, default=0.3, help="доля привычек на 08:00 местного времени")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--now", type=datetime.fromisoformat, help="момент запуска задач (ISO, с часовым поясом)")
+    parser.add_argument("--catchup", type=int, default=0, help="отставание водяного знака send_due_habits, минут")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        compare(args.old, args.new)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
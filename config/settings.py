@@ -171,22 +171,113 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 CORS_ALLOW_ALL_ORIGINS = True
 
 REDIS_URL = os.getenv("REDIS_URL")
-REDIS_CACHE_URL = os.getenv("CELERY_BROKER_URL")
+REDIS_CACHE_URL = os.getenv("REDIS_CACHE_URL", REDIS_URL)
+
+# Кэш Django: версии привычек и ответы /api/habits/ (habits.versions); без Redis — в памяти процесса.
+if REDIS_CACHE_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": REDIS_CACHE_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# ETag и кэш ответов /api/habits/ — только с общим для всех процессов кэшем (Redis):
+# версию меняют бот, Celery и другие воркеры web, в LocMemCache они её не увидят.
+HABITS_API_CACHE = bool(REDIS_CACHE_URL)
+# Сколько секунд хранится сериализованная страница списка привычек.
+HABITS_API_CACHE_TTL = int(os.getenv("HABITS_API_CACHE_TTL", 300))
+# Максимум элементов (create + update + delete) в одном запросе POST /api/habits/bulk/.
+HABITS_BULK_MAX_ITEMS = int(os.getenv("HABITS_BULK_MAX_ITEMS", 1000))
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND")
 CELERY_TIMEZONE = TIME_ZONE
+# Кэш пользователей бота по chat_id (tgbot.users): размер и время жизни записи, секунд.
+BOT_USER_CACHE_SIZE = int(os.getenv("BOT_USER_CACHE_SIZE", 10_000))
+BOT_USER_CACHE_TTL = float(os.getenv("BOT_USER_CACHE_TTL", 60))
+# Состояние диалогов бота (tgbot.state): Redis для нескольких реплик; без URL — в памяти процесса.
+BOT_STATE_URL = os.getenv("BOT_STATE_URL", REDIS_URL)
+BOT_STATE_TTL = int(os.getenv("BOT_STATE_TTL", 60 * 60))
+# Вебхук бота (tgbot.webhook): секрет из set_webhook и публичный URL.
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "")
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "")
+# Сколько секунд запрос ждёт блокировку чата (иначе 503) и сколько параллельных соединений
+# открывает Telegram (1 — строгий порядок апдейтов, но без параллелизма).
+TELEGRAM_WEBHOOK_LOCK_WAIT = float(os.getenv("TELEGRAM_WEBHOOK_LOCK_WAIT", 10))
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_WEBHOOK_MAX_CONNECTIONS", 40))
+# Рантайм бота на пуле потоков (tgbot.threaded): потоки для синхронных хендлеров (потолок параллелизма)
+# и предел апдейтов, принятых, но ещё не обработанных.
+BOT_THREADED_WORKERS = int(os.getenv("BOT_THREADED_WORKERS", 64))
+BOT_THREADED_MAX_PENDING = int(os.getenv("BOT_THREADED_MAX_PENDING", 1000))
+# Метрики хендлеров бота (tgbot.metrics): сводка в лог раз в N секунд (0 — выкл.) и токен для их выдачи.
+# Процесс бота отдаёт свои метрики на BOT_METRICS_PORT (0 — не отдаёт); /telegram/metrics/ в web —
+# только метрики вебхука того воркера, что ответил.
+BOT_METRICS_LOG_INTERVAL = int(os.getenv("BOT_METRICS_LOG_INTERVAL", 300))
+BOT_METRICS_TOKEN = os.getenv("BOT_METRICS_TOKEN", "")
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", 0))
+
+# Событийный планировщик (reminder_scheduler.py): публикация изменений привычек в Redis pub/sub.
+HABITS_EVENTS_URL = os.getenv("HABITS_EVENTS_URL")
+HABITS_TIMER_DAEMON = os.getenv("HABITS_TIMER_DAEMON", "False").lower() in ("1", "true", "yes")
+HABITS_TIMER_RELOAD_SECONDS = int(os.getenv("HABITS_TIMER_RELOAD_SECONDS", 3600))
+
 CELERY_BEAT_SCHEDULE = {
+    # С демоном send_due_habits — только страховка: догоняет пропуски по водяному знаку.
     "send_due_habits_every_minute": {
         "task": "habits.tasks.send_due_habits",
-        "schedule": 60.0,
+        "schedule": 60.0 * (15 if HABITS_TIMER_DAEMON else 1),
     },
     "notify_overdue_daily": {
         "task": "habits.tasks.notify_overdue",
         "schedule": 60.0 * 60 * 24,
     },
+    "resync_fire_minutes_every_15_minutes": {
+        "task": "habits.tasks.resync_fire_minutes",
+        "schedule": 60.0 * 15,
+    },
+    "deliver_notifications_every_minute": {
+        "task": "habits.tasks.deliver_notifications",
+        "schedule": 60.0,
+    },
+    "purge_notifications_daily": {
+        "task": "habits.tasks.purge_notifications",
+        "schedule": 60.0 * 60 * 24,
+    },
 }
+# Доставку outbox можно масштабировать отдельно: worker -Q notifications.
+CELERY_TASK_ROUTES = {
+    "habits.tasks.deliver_notifications": {"queue": "notifications"},
+}
+
+# Размер пачки при потоковом сканировании привычек в задачах Celery.
+HABITS_SCAN_BATCH_SIZE = int(os.getenv("HABITS_SCAN_BATCH_SIZE", 500))
+# На сколько шардов (диапазонов id) делить сканирование; 1 — без fan-out.
+HABITS_SCAN_SHARDS = int(os.getenv("HABITS_SCAN_SHARDS", 1))
+# На сколько минут назад send_due_habits догоняет пропущенные тики (после простоя/деплоя).
+HABITS_MAX_CATCHUP_MINUTES = int(os.getenv("HABITS_MAX_CATCHUP_MINUTES", 60))
+# Сколько дней хранятся завершённые чекпоинты сканирований (чистит purge_notifications).
+HABITS_CHECKPOINT_RETENTION_DAYS = int(os.getenv("HABITS_CHECKPOINT_RETENTION_DAYS", 7))
+# Аренда периодических задач (habits.locks): Redis обязателен; аренды в памяти процесса — только при DEBUG.
+HABITS_LOCK_URL = os.getenv("HABITS_LOCK_URL", REDIS_URL)
+HABITS_LOCK_TTL = int(os.getenv("HABITS_LOCK_TTL", 300))
+
+# Отправка напоминаний: размер пула соединений/потоков и таймаут запроса.
+TELEGRAM_SEND_CONCURRENCY = int(os.getenv("TELEGRAM_SEND_CONCURRENCY", 8))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", 5))
+# Общий лимит отправки в Telegram (habits.ratelimit): глобально и на чат, сообщений в секунду.
+TELEGRAM_RATE_LIMIT_URL = os.getenv("TELEGRAM_RATE_LIMIT_URL", REDIS_URL)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_CHAT_RATE = float(os.getenv("TELEGRAM_CHAT_RATE", 1))
+TELEGRAM_CHAT_BURST = float(os.getenv("TELEGRAM_CHAT_BURST", 3))
+# Сколько токенов глобальной корзины рассылки оставляют ответам бота и сколько секунд ждут токен.
+TELEGRAM_INTERACTIVE_RESERVE = float(os.getenv("TELEGRAM_INTERACTIVE_RESERVE", 5))
+TELEGRAM_BULK_MAX_WAIT = float(os.getenv("TELEGRAM_BULK_MAX_WAIT", 30))
+TELEGRAM_INTERACTIVE_MAX_WAIT = float(os.getenv("TELEGRAM_INTERACTIVE_MAX_WAIT", 10))
+# Outbox: через сколько секунд «зависшая» отправка забирается повторно и сколько дней храним отправленное.
+NOTIFICATION_CLAIM_TIMEOUT = int(os.getenv("NOTIFICATION_CLAIM_TIMEOUT", 300))
+NOTIFICATION_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", 7))
+# Повторы доставки: максимум попыток и экспоненциальный backoff (секунды).
+NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5))
+NOTIFICATION_BACKOFF_BASE = float(os.getenv("NOTIFICATION_BACKOFF_BASE", 5))
+NOTIFICATION_BACKOFF_CAP = float(os.getenv("NOTIFICATION_BACKOFF_CAP", 600))
 
 SWAGGER_SETTINGS = {
     "USE_SESSION_AUTH": False,
@@ -202,3 +293,4 @@ SWAGGER_SETTINGS = {
 
 if os.getenv("USE_SQLITE_FOR_TESTS") == "1":
     DATABASES = {"default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"}}
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
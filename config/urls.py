@@ -8,6 +8,7 @@ from rest_framework_simplejwt.views import (TokenObtainPairView,
                                             TokenRefreshView)
 
 from habits.views import HabitViewSet
+from tgbot.webhook import telegram_metrics, telegram_webhook
 
 router = DefaultRouter()
 router.register(r"habits", HabitViewSet, basename="habits")
@@ -23,6 +24,8 @@ urlpatterns = [
     path("api/", include(router.urls)),
     path("auth/jwt/create/", TokenObtainPairView.as_view(), name="jwt-create"),
     path("auth/jwt/refresh/", TokenRefreshView.as_view(), name="jwt-refresh"),
+    path("telegram/webhook/", telegram_webhook, name="telegram-webhook"),
+    path("telegram/metrics/", telegram_metrics, name="telegram-metrics"),
     re_path(
         r"^swagger(?P<format>\.json|\.yaml)$",
         schema_view.without_ui(cache_timeout=0),
@@ -1,9 +1,25 @@
 from django.contrib import admin
+from django.utils import timezone
 
-from .models import Habit
+from .models import Habit, Notification
 
 
 @admin.register(Habit)
 class HabitAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "action")
+    list_display = ("id", "user", "action", "next_due_at", "overdue_at")
     search_fields = ("action", "user__username")
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("id", "habit", "kind", "slot", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("kind", "status")
+    raw_id_fields = ("habit",)
+    readonly_fields = ("last_error",)
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected dead letters")
+    def requeue(self, request, queryset):
+        queryset.filter(status=Notification.Status.DEAD).update(
+            status=Notification.Status.PENDING, attempts=0, next_attempt_at=timezone.now()
+        )
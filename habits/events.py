@@ -0,0 +1,48 @@
+"""
+События изменения расписания для демона напоминаний (reminder_scheduler.py).
+
+Сигналы моделей публикуют в Redis pub/sub короткие сообщения вида
+{"habit": id}, {"habit": id, "deleted": true} или {"user": id}; демон
+перечитывает только затронутые привычки. Без HABITS_EVENTS_URL публикация
+отключена — минутный send_due_habits в beat работает как раньше.
+"""
+
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "habits:schedule"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import redis
+
+                _client = redis.Redis.from_url(settings.HABITS_EVENTS_URL)
+    return _client
+
+
+def publish(**event):
+    """Публикует событие после коммита транзакции (демон увидит уже новые данные)."""
+    if not settings.HABITS_EVENTS_URL:
+        return
+    payload = json.dumps(event)
+
+    def send():
+        try:
+            get_client().publish(CHANNEL, payload)
+        except Exception:  # демон догонит изменения при периодической полной перезагрузке
+            logger.warning("schedule event %s was not published", payload, exc_info=True)
+
+    transaction.on_commit(send)
@@ -0,0 +1,160 @@
+"""
+Аренда (lease) для периодических задач: пока аренда у одного запуска,
+параллельные запуски той же задачи пропускаются. Аренда истекает сама
+через ttl, поэтому упавший воркер не блокирует задачу навсегда.
+
+Каждое получение аренды выдаёт монотонно растущий fencing-токен. Запись
+прогресса (ScanCheckpoint) проверяет токен: запуск, у которого аренда уже
+истекла и перешла к другому, не перезапишет более свежие данные. Токены
+берутся из счётчика в БД (LockFence), а не из Redis или памяти процесса,
+поэтому после перезапуска они продолжают расти, а не начинаются с 1.
+"""
+
+import functools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F
+
+from .models import LockFence
+
+logger = logging.getLogger(__name__)
+
+
+class LockLost(Exception):
+    """Аренда истекла и перешла к другому запуску (устаревший fencing-токен)."""
+
+
+class Handoff(dict):
+    """
+    Результат задачи, передавшей аренду дальше (например, колбэку chord):
+    singleton её не снимает — это делает получатель через release_lease.
+    """
+
+
+def next_fence(name) -> int:
+    """Следующий fencing-токен аренды name: атомарный инкремент строки LockFence."""
+    with transaction.atomic():
+        LockFence.objects.get_or_create(name=name)
+        LockFence.objects.filter(name=name).update(value=F("value") + 1)
+        return LockFence.objects.values_list("value", flat=True).get(name=name)
+
+
+class MemoryLockBackend:
+    """
+    Аренды внутри одного процесса — только для тестов и DEBUG: воркеры prefork
+    и разные хосты друг друга не видят.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._leases = {}
+
+    def acquire(self, name, token, ttl):
+        with self._mutex:
+            lease = self._leases.get(name)
+            if lease and lease[1] > time.monotonic():
+                return False
+            self._leases[name] = (token, time.monotonic() + ttl)
+            return True
+
+    def release(self, name, token):
+        with self._mutex:
+            lease = self._leases.get(name)
+            if lease and lease[0] == token:
+                del self._leases[name]
+                return True
+            return False
+
+
+class RedisLockBackend:
+    """
+    Аренда в Redis: SET NX PX со значением-токеном. Снятие — Lua-скриптом
+    «удалить, только если значение моё».
+    """
+
+    RELEASE = """
+    if redis.call("get", KEYS[1]) == ARGV[1] then
+        return redis.call("del", KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix="habits:lock:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._release = self.client.register_script(self.RELEASE)
+
+    def acquire(self, name, token, ttl):
+        return bool(self.client.set(self.prefix + name, token, nx=True, px=int(ttl * 1000)))
+
+    def release(self, name, token):
+        return bool(self._release(keys=[self.prefix + name], args=[token]))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_lock_backend():
+    """Redis по HABITS_LOCK_URL; аренды в памяти процесса — только при DEBUG."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = settings.HABITS_LOCK_URL
+                if url:
+                    _backend = RedisLockBackend(url)
+                elif settings.DEBUG:
+                    logger.warning("HABITS_LOCK_URL is not set, task leases are per-process")
+                    _backend = MemoryLockBackend()
+                else:
+                    raise ImproperlyConfigured("HABITS_LOCK_URL (или REDIS_URL) нужен для аренды задач")
+    return _backend
+
+
+def release_lease(name, token):
+    """Снимает аренду, переданную через Handoff (её держатель — token)."""
+    if not get_lock_backend().release(name, token):
+        logger.warning("%s: lease %s already expired", name, token)
+
+
+def singleton(name=None, ttl=None):
+    """
+    Декоратор задачи: выполняет её, только если удалось взять аренду name.
+    Иначе запуск пропускается и возвращает {"skipped": True}. Fencing-токен
+    передаётся в задачу именованным аргументом fence.
+
+    Аренда снимается после возврата задачи, если только та не вернула Handoff:
+    тогда аренду держит раздача шардов до колбэка chord (или до истечения ttl,
+    если шард упал и колбэк не запустится).
+    """
+
+    def decorator(func):
+        lock_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            backend = get_lock_backend()
+            token = next_fence(lock_name)
+            if not backend.acquire(lock_name, token, ttl or settings.HABITS_LOCK_TTL):
+                logger.info("%s: already running, skipped", lock_name)
+                return {"skipped": True}
+            handed_off = False
+            try:
+                result = func(*args, fence=token, **kwargs)
+                handed_off = isinstance(result, Handoff)
+                return result
+            finally:
+                if not handed_off:
+                    backend.release(lock_name, token)
+
+        return wrapper
+
+    return decorator
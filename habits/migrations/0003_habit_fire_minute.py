@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:38
+
+from django.db import migrations, models
+
+
+def fill_fire_minute(apps, schema_editor):
+    from habits.scheduling import fire_minute, tz_from_name
+
+    Habit = apps.get_model("habits", "Habit")
+    habits = list(Habit.objects.select_related("user"))
+    for habit in habits:
+        habit.fire_minute = fire_minute(habit.time, tz_from_name(habit.user.timezone))
+    Habit.objects.bulk_update(habits, ["fire_minute"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0002_remove_habitlog_habit_and_more"),
+        ("users", "0002_alter_user_language"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="fire_minute",
+            field=models.PositiveSmallIntegerField(
+                db_index=True, default=0, editable=False
+            ),
+        ),
+        migrations.RunPython(fill_fire_minute, migrations.RunPython.noop),
+    ]
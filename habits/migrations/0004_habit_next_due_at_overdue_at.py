@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+def fill_schedule_marks(apps, schema_editor):
+    from habits.scheduling import schedule_marks, tz_from_name
+
+    Habit = apps.get_model("habits", "Habit")
+    habits = list(Habit.objects.select_related("user"))
+    for habit in habits:
+        habit.next_due_at, habit.overdue_at = schedule_marks(
+            habit.last_performed_at,
+            habit.periodicity_days,
+            tz_from_name(habit.user.timezone),
+        )
+    Habit.objects.bulk_update(habits, ["next_due_at", "overdue_at"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0003_habit_fire_minute"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="habit",
+            name="next_due_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="habit",
+            name="overdue_at",
+            field=models.DateTimeField(
+                blank=True, db_index=True, editable=False, null=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="habit",
+            name="fire_minute",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="habit",
+            index=models.Index(
+                fields=["fire_minute", "next_due_at"], name="habit_fire_due_idx"
+            ),
+        ),
+        migrations.RunPython(fill_schedule_marks, migrations.RunPython.noop),
+    ]
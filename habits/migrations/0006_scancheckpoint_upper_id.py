@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0005_scancheckpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scancheckpoint",
+            name="upper_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def failed_to_dead(apps, schema_editor):
+    Notification = apps.get_model("habits", "Notification")
+    Notification.objects.filter(status="failed").update(status="dead")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0007_notification"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notification_status_idx",
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="last_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="next_attempt_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("dead", "Dead letter"),
+                ],
+                default="pending",
+                max_length=16,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["status", "next_attempt_at"], name="notification_status_idx"
+            ),
+        ),
+        migrations.RunPython(failed_to_dead, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0008_notification_retries"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scancheckpoint",
+            name="watermark",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0009_scancheckpoint_watermark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scancheckpoint",
+            name="fence",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-18 12:25
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_fences(apps, schema_editor):
+    # токены, уже записанные в чекпоинты (из Redis/памяти), не должны стать «будущими»
+    ScanCheckpoint = apps.get_model("habits", "ScanCheckpoint")
+    LockFence = apps.get_model("habits", "LockFence")
+    for row in ScanCheckpoint.objects.values("name").annotate(fence=Max("fence")):
+        LockFence.objects.create(name=row["name"], value=row["fence"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("habits", "0011_habit_user_id_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LockFence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=64, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_fences, migrations.RunPython.noop),
+    ]
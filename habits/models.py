@@ -1,6 +1,79 @@
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
+
+from . import events, versions
+from .scheduling import fire_minute, local_midnight, schedule_marks, tz_from_name, user_tz
+
+# Поля, от которых зависит расписание, и поля, которые из них вычисляются.
+SCHEDULE_INPUTS = frozenset({"time", "user", "periodicity_days", "last_performed_at"})
+SCHEDULE_FIELDS = ("fire_minute", "next_due_at", "overdue_at")
+# Допустимая периодичность, дней (см. валидаторы Habit.periodicity_days).
+PERIODICITY_DAYS = range(1, 8)
+
+
+class HabitQuerySet(models.QuerySet):
+    def resync_schedule(self, user=None, now=None):
+        """
+        Пересчитывает вычисляемые поля расписания и сохраняет только изменившиеся
+        строки. Возвращает количество обновлённых привычек.
+        """
+        qs = self if user is not None else self.select_related("user")
+        changed = []
+        for habit in qs:
+            before = [getattr(habit, f) for f in SCHEDULE_FIELDS]
+            habit.refresh_schedule(user=user, now=now)
+            if before != [getattr(habit, f) for f in SCHEDULE_FIELDS]:
+                changed.append(habit)
+        if changed:
+            self.model.objects.bulk_update(changed, SCHEDULE_FIELDS)
+        return len(changed)
+
+    def _check_in(self, user_id, tzname, now):
+        tz = tz_from_name(tzname)
+        day_start = local_midnight(now.astimezone(tz).date(), tz)
+        marks = {p: schedule_marks(now, p, tz) for p in PERIODICITY_DAYS}
+        return (
+            self.filter(user_id=user_id, user__timezone=tzname)
+            .filter(models.Q(last_performed_at__isnull=True) | models.Q(last_performed_at__lt=day_start))
+            .update(
+                last_performed_at=now,
+                next_due_at=models.Case(
+                    *(models.When(periodicity_days=p, then=models.Value(m[0])) for p, m in marks.items()),
+                    default=models.F("next_due_at"),
+                ),
+                overdue_at=models.Case(
+                    *(models.When(periodicity_days=p, then=models.Value(m[1])) for p, m in marks.items()),
+                    default=models.F("overdue_at"),
+                ),
+            )
+        )
+
+    def check_in(self, user, now=None):
+        """
+        Отмечает выполнение одним условным UPDATE: только привычки user, ещё не
+        выполненные в текущий локальный день пользователя. Поля расписания
+        пересчитываются в том же запросе (CASE по периодичности). Возвращает
+        число отмеченных — 0 значит «уже выполнено сегодня» (или не найдено).
+
+        user может быть из кэша бота (tgbot.users) с устаревшим часовым поясом,
+        поэтому UPDATE условен и по нему: не совпал с БД — перечитываем пояс и
+        повторяем, а не пишем расписание, посчитанное в старом поясе.
+        """
+        now = now or timezone.now()
+        tzname = getattr(user, "timezone", None)
+        updated = self._check_in(user.pk, tzname, now)
+        if not updated:
+            actual = get_user_model().objects.filter(pk=user.pk).values_list("timezone", flat=True).first()
+            if actual != tzname:
+                updated = self._check_in(user.pk, actual, now)
+        if updated:
+            # UPDATE минует сигналы — сообщаем планировщику напоминаний сами.
+            events.publish(user=user.pk)
+            versions.bump(user.pk)
+        return updated
 
 
 class Habit(models.Model):
@@ -11,9 +84,122 @@ class Habit(models.Model):
     action = models.CharField(max_length=255)
     periodicity_days = models.PositiveSmallIntegerField(
         default=1,
-        validators=[MinValueValidator(1), MaxValueValidator(7)],
+        validators=[MinValueValidator(PERIODICITY_DAYS[0]), MaxValueValidator(PERIODICITY_DAYS[-1])],
     )
     last_performed_at = models.DateTimeField(null=True, blank=True)
+    # Минута суток в UTC, когда нужно напоминать (с учётом часового пояса владельца).
+    fire_minute = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Материализованное состояние «пора выполнять» / «просрочено» (см. schedule_marks).
+    next_due_at = models.DateTimeField(null=True, blank=True, editable=False)
+    overdue_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+
+    objects = HabitQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fire_minute", "next_due_at"], name="habit_fire_due_idx"),
+            # список /api/habits/ пользователя по id (keyset-пагинация)
+            models.Index(fields=["user", "id"], name="habit_user_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.action} @ {self.time}"
+
+    def refresh_schedule(self, user=None, now=None):
+        tz = user_tz(user or self.user)
+        local_time = self._meta.get_field("time").to_python(self.time)
+        last_performed_at = self._meta.get_field("last_performed_at").to_python(self.last_performed_at)
+        self.fire_minute = fire_minute(local_time, tz, now)
+        self.next_due_at, self.overdue_at = schedule_marks(
+            last_performed_at, self.periodicity_days, tz, now
+        )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or SCHEDULE_INPUTS.intersection(update_fields):
+            self.refresh_schedule()
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields).union(SCHEDULE_FIELDS)
+        super().save(*args, **kwargs)
+
+
+class ScanCheckpoint(models.Model):
+    """
+    Прогресс периодического сканирования привычек: до какого id дошёл запуск.
+    Перезапущенный после падения воркера запуск продолжает с last_id.
+    При шардировании у каждого шарда свой чекпоинт с верхней границей upper_id.
+    watermark — последняя обработанная минута (для send_due_habits).
+    fence — fencing-токен аренды (habits.locks) последнего записавшего запуска.
+    """
+
+    name = models.CharField(max_length=64)
+    run_key = models.CharField(max_length=64)
+    last_id = models.BigIntegerField(default=0)
+    upper_id = models.BigIntegerField(null=True, blank=True)
+    watermark = models.DateTimeField(null=True, blank=True)
+    fence = models.BigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["name", "run_key"], name="scan_checkpoint_run_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.name}[{self.run_key}] @ {self.last_id}"
+
+
+class LockFence(models.Model):
+    """
+    Счётчик fencing-токенов аренды name (habits.locks). Хранится в БД рядом с
+    ScanCheckpoint.fence, поэтому не сбрасывается при перезапуске процесса
+    или Redis и всегда больше токенов, уже записанных в чекпоинты.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+class Notification(models.Model):
+    """
+    Outbox напоминаний: сканирования только добавляют строки (уникальный слот
+    не даёт задвоить уведомление), доставкой занимается deliver_notifications.
+    Временные ошибки откладывают уведомление до next_attempt_at; исчерпавшие
+    попытки и отвергнутые Telegram уходят в DEAD (dead-letter).
+    """
+
+    class Kind(models.TextChoices):
+        DUE = "due", "Due"
+        OVERDUE = "overdue", "Overdue"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENDING = "sending", "Sending"
+        SENT = "sent", "Sent"
+        DEAD = "dead", "Dead letter"
+
+    habit = models.ForeignKey(Habit, on_delete=models.CASCADE, related_name="notifications")
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    slot = models.DateTimeField()
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["habit", "kind", "slot"], name="notification_slot_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="notification_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.habit_id} @ {self.slot} [{self.status}]"
@@ -0,0 +1,38 @@
+"""
+Пагинация /api/habits/.
+
+По умолчанию — прежние номера страниц (?page=N, PAGE_SIZE из настроек DRF),
+чтобы существующие клиенты не сломались. С параметром ?cursor= (для первой
+страницы — пустым) включается keyset-пагинация по id: без COUNT(*) и OFFSET,
+глубокие страницы стоят столько же, сколько первая (индекс habit_user_id_idx).
+Размер страницы задаёт клиент — ?page_size=, не больше max_page_size.
+"""
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class HabitCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class HabitPagination(PageNumberPagination):
+    cursor_class = HabitCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if self.cursor_class.cursor_query_param in request.query_params:
+            self.cursor = self.cursor_class()
+            return self.cursor.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor is not None:
+            return self.cursor.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.cursor is not None:
+            return self.cursor.get_html_context()
+        return super().get_html_context()
@@ -0,0 +1,173 @@
+"""
+Общий лимит отправки в Telegram: token bucket на весь бот (~30 сообщений/с)
+и на каждый чат (~1 сообщение/с с небольшим запасом на всплеск).
+
+Через лимитер идут и напоминания из Celery (habits.telegram.TelegramSender),
+и ответы бота (telegram_bot.py, apihelper.CUSTOM_REQUEST_SENDER). Состояние
+корзин — в Redis (TELEGRAM_RATE_LIMIT_URL, по умолчанию REDIS_URL), поэтому
+лимит общий для всех процессов; без Redis или при его недоступности — корзины
+в памяти процесса.
+
+Приоритет: массовые рассылки (BULK) не берут последние TELEGRAM_INTERACTIVE_RESERVE
+токенов глобальной корзины — они остаются для ответов пользователям (INTERACTIVE).
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+
+class MemoryBuckets:
+    # Как часто (с) убирать корзины чатов, успевшие наполниться: полная корзина
+    # ничем не отличается от отсутствующей, а без чистки словарь растёт с каждым новым чатом.
+    SWEEP_INTERVAL = 60
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept_at = time.monotonic()
+
+    def _sweep(self, rate, capacity, now):
+        full = [
+            key
+            for key, (tokens, ts) in self._buckets.items()
+            if key != "global" and tokens + (now - ts) * rate >= capacity
+        ]
+        for key in full:
+            del self._buckets[key]
+        self._swept_at = now
+
+    def _level(self, key, rate, capacity, now):
+        tokens, ts = self._buckets.get(key, (capacity, now))
+        return min(capacity, tokens + (now - ts) * rate)
+
+    def take(self, chat_key, limits, reserve):
+        """
+        Берёт по токену из глобальной корзины и корзины чата, если в обеих есть.
+        Возвращает 0 или сколько секунд подождать до следующей попытки.
+        """
+        (g_rate, g_cap), (c_rate, c_cap) = limits
+        with self._lock:
+            now = time.monotonic()
+            if now - self._swept_at >= self.SWEEP_INTERVAL:
+                self._sweep(c_rate, c_cap, now)
+            g = self._level("global", g_rate, g_cap, now)
+            wait = max(0.0, (1 + reserve - g) / g_rate)
+            if chat_key is not None:
+                c = self._level(chat_key, c_rate, c_cap, now)
+                wait = max(wait, (1 - c) / c_rate)
+            if wait > 0:
+                return wait
+            self._buckets["global"] = (g - 1, now)
+            if chat_key is not None:
+                self._buckets[chat_key] = (c - 1, now)
+            return 0.0
+
+
+class RedisBuckets:
+    """Те же корзины в Redis; проверка и списание обеих — атомарно, одним Lua-скриптом."""
+
+    TAKE = """
+    local t = redis.call("TIME")
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local function level(key, rate, cap)
+        local v = redis.call("HMGET", key, "tokens", "ts")
+        local tokens = tonumber(v[1]) or cap
+        local ts = tonumber(v[2]) or now
+        return math.min(cap, tokens + (now - ts) * rate)
+    end
+    local g_rate, g_cap = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local c_rate, c_cap = tonumber(ARGV[3]), tonumber(ARGV[4])
+    local reserve = tonumber(ARGV[5])
+    local g = level(KEYS[1], g_rate, g_cap)
+    local wait = math.max(0, (1 + reserve - g) / g_rate)
+    local c = 0
+    if KEYS[2] ~= "" then
+        c = level(KEYS[2], c_rate, c_cap)
+        wait = math.max(wait, (1 - c) / c_rate)
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+    redis.call("HSET", KEYS[1], "tokens", g - 1, "ts", now)
+    redis.call("EXPIRE", KEYS[1], 60)
+    if KEYS[2] ~= "" then
+        redis.call("HSET", KEYS[2], "tokens", c - 1, "ts", now)
+        redis.call("EXPIRE", KEYS[2], 60)
+    end
+    return "0"
+    """
+
+    def __init__(self, url, prefix="tg:rate:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._take = self.client.register_script(self.TAKE)
+
+    def take(self, chat_key, limits, reserve):
+        (g_rate, g_cap), (c_rate, c_cap) = limits
+        keys = [self.prefix + "global", self.prefix + chat_key if chat_key is not None else ""]
+        return float(self._take(keys=keys, args=[g_rate, g_cap, c_rate, c_cap, reserve]))
+
+
+class RateLimiter:
+    def __init__(self, backend, global_rate=30, global_burst=30, chat_rate=1, chat_burst=3, interactive_reserve=5):
+        self.backend = backend
+        self.fallback = MemoryBuckets()
+        self.limits = ((global_rate, global_burst), (chat_rate, chat_burst))
+        self.interactive_reserve = interactive_reserve
+
+    def wait_time(self, chat_id=None, priority=BULK) -> float:
+        """Пытается взять токен: 0 — можно отправлять, иначе — сколько секунд подождать."""
+        chat_key = f"chat:{chat_id}" if chat_id is not None else None
+        reserve = self.interactive_reserve if priority == BULK else 0
+        try:
+            return self.backend.take(chat_key, self.limits, reserve)
+        except Exception:
+            if self.backend is self.fallback:
+                raise
+            logger.warning("rate limiter backend failed, using in-process buckets", exc_info=True)
+            return self.fallback.take(chat_key, self.limits, reserve)
+
+    def acquire(self, chat_id=None, priority=BULK, timeout=None) -> float:
+        """
+        Ждёт токен не дольше timeout секунд. Возвращает 0, если токен получен,
+        иначе — оценку, через сколько секунд стоит попробовать снова.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.wait_time(chat_id, priority)
+            if wait <= 0:
+                return 0.0
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return wait
+            time.sleep(wait)
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                url = settings.TELEGRAM_RATE_LIMIT_URL
+                _limiter = RateLimiter(
+                    RedisBuckets(url) if url else MemoryBuckets(),
+                    global_rate=settings.TELEGRAM_GLOBAL_RATE,
+                    global_burst=settings.TELEGRAM_GLOBAL_RATE,
+                    chat_rate=settings.TELEGRAM_CHAT_RATE,
+                    chat_burst=settings.TELEGRAM_CHAT_BURST,
+                    interactive_reserve=settings.TELEGRAM_INTERACTIVE_RESERVE,
+                )
+    return _limiter
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from datetime import time as dt_time
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.db.models import F
+from django.db.models.functions import ExtractHour, ExtractMinute
+from django.utils import timezone
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def tz_from_name(tzname):
+    try:
+        return ZoneInfo(tzname or "UTC")
+    except Exception:
+        return ZoneInfo("UTC")
+
+
+def user_tz(user):
+    return tz_from_name(getattr(user, "timezone", None))
+
+
+def utc_offset_minutes(tz, at=None) -> int:
+    at = at or timezone.now()
+    return int(at.astimezone(tz).utcoffset().total_seconds() // 60)
+
+
+def utc_minute(dt) -> int:
+    """Минута суток (0..1439) момента dt в UTC."""
+    dt = dt.astimezone(dt_timezone.utc)
+    return dt.hour * 60 + dt.minute
+
+
+def fire_minute(local_time, tz, at=None) -> int:
+    """
+    Минута суток в UTC, на которую приходится ближайшее (не раньше at, по
+    умолчанию — сейчас) наступление local_time в часовом поясе tz. Смещение
+    берётся на момент этого наступления, а не на момент at, поэтому значение,
+    посчитанное накануне перехода на летнее/зимнее время, уже верно для
+    первого срабатывания после перехода. Следующие наступления поддерживает
+    habits.tasks.resync_fire_minutes.
+    """
+    return utc_minute(next_fire_at(local_time, tz, at or timezone.now()))
+
+
+def local_midnight(day, tz):
+    return datetime.combine(day, dt_time.min, tzinfo=tz)
+
+
+def schedule_marks(last_performed_at, periodicity_days, tz, now=None):
+    """
+    Возвращает (next_due_at, overdue_at):
+      - next_due_at — начало локального дня, с которого привычку пора выполнять
+        (прошло >= periodicity_days дней с последнего выполнения);
+      - overdue_at — начало локального дня, с которого она просрочена
+        (прошло > periodicity_days дней).
+    Если привычка ни разу не выполнялась, она и к выполнению, и просрочена
+    с начала текущего локального дня.
+    """
+    if last_performed_at is None:
+        today = (now or timezone.now()).astimezone(tz).date()
+        start = local_midnight(today, tz)
+        return start, start
+    last_day = last_performed_at.astimezone(tz).date()
+    return (
+        local_midnight(last_day + timedelta(days=periodicity_days), tz),
+        local_midnight(last_day + timedelta(days=periodicity_days + 1), tz),
+    )
+
+
+def fire_minute_expression(offset_minutes: int):
+    """SQL-выражение fire_minute для привычек пользователей с заданным смещением."""
+    return (
+        ExtractHour(F("time")) * 60
+        + ExtractMinute(F("time"))
+        - offset_minutes
+        + MINUTES_PER_DAY
+    ) % MINUTES_PER_DAY
+
+
+def next_fire_at(local_time, tz, not_before):
+    """
+    Ближайший момент не раньше not_before, когда в часовом поясе tz наступает
+    local_time. В отличие от fire_minute, учитывает переходы на летнее/зимнее время.
+    """
+    day = not_before.astimezone(tz).date()
+    while True:
+        at = datetime.combine(day, local_time, tzinfo=tz).astimezone(dt_timezone.utc)
+        if at >= not_before:
+            return at
+        day += timedelta(days=1)
@@ -20,3 +20,18 @@ class HabitSerializer(serializers.ModelSerializer):
         )
         validated_data["user"] = user
         return super().create(validated_data)
+
+
+class HabitBulkSerializer(serializers.Serializer):
+    """Пакет для POST /api/habits/bulk/: создаваемые, частичные обновления (с id) и id на удаление."""
+
+    create = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    update = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+
+    def validate(self, attrs):
+        total = sum(len(attrs[op]) for op in ("create", "update", "delete"))
+        limit = self.context["max_items"]
+        if total > limit:
+            raise serializers.ValidationError(f"Не больше {limit} элементов в пакете.")
+        return attrs
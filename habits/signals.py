@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import events, versions
+from .models import Habit
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def resync_habits_on_timezone_change(sender, instance, created, update_fields=None, **kwargs):
+    """Сменился часовой пояс пользователя — пересчитываем расписание его привычек."""
+    if created:
+        return
+    if update_fields is not None and "timezone" not in update_fields:
+        return
+    Habit.objects.filter(user=instance).resync_schedule(user=instance)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def publish_user_schedule_event(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Часовой пояс или чат влияют на все напоминания пользователя (см. habits.timer);
+    язык — на то, как бот с ним говорит (кэш пользователей, tgbot.users).
+    """
+    if created:
+        return
+    if update_fields is not None and not {"timezone", "telegram_chat_id", "language"} & set(update_fields):
+        return
+    events.publish(user=instance.pk)
+
+
+@receiver(post_save, sender=Habit)
+def publish_habit_saved(sender, instance, **kwargs):
+    events.publish(habit=instance.pk)
+
+
+@receiver(post_delete, sender=Habit)
+def publish_habit_deleted(sender, instance, **kwargs):
+    events.publish(habit=instance.pk, deleted=True)
+
+
+@receiver(post_save, sender=Habit)
+@receiver(post_delete, sender=Habit)
+def bump_habits_version(sender, instance, **kwargs):
+    """Меняет ETag и ключи кэша списка /api/habits/ пользователя (см. habits.versions)."""
+    versions.bump(instance.user_id)
@@ -1,13 +1,33 @@
-import os
-import requests
+import logging
+import math
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
 
-from celery import shared_task
+from celery import chord, group, shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Max, Min, Q
 from django.utils import timezone
-from zoneinfo import ZoneInfo
 
-from .models import Habit
+from .locks import Handoff, LockLost, release_lease, singleton
+from .models import Habit, Notification, ScanCheckpoint
+from .scheduling import (MINUTES_PER_DAY, fire_minute, fire_minute_expression,
+                         local_midnight, tz_from_name, utc_minute, utc_offset_minutes)
+from .telegram import get_sender, retry_delay
 
-BOT_TOKEN = os.getenv("BOT_TOKEN")
+logger = logging.getLogger(__name__)
+
+# Сколько привычек максимум в одном сообщении-дайджесте; длину дополнительно
+# ограничивает лимит Telegram на текст сообщения.
+DIGEST_MAX_ITEMS = 30
+TELEGRAM_MAX_TEXT = 4096
+# Длинные action (до 255 символов) в напоминаниях обрезаются.
+ACTION_MAX_CHARS = 100
+
+
+def _short(action: str) -> str:
+    return action if len(action) <= ACTION_MAX_CHARS else action[:ACTION_MAX_CHARS - 1] + "…"
 
 
 def _lang(user) -> str:
@@ -20,106 +40,516 @@ def _tr(user, ru: str, es: str, en: str) -> str:
     return {"ru": ru, "es": es}.get(lang, en)
 
 
-def _user_tz(user):
-    tzname = getattr(user, "timezone", None) or "UTC"
-    try:
-        return ZoneInfo(tzname)
-    except Exception:
-        return ZoneInfo("UTC")
+def _iter_chunks(qs, batch_size, after_id=0, fields=("id",)):
+    """
+    Keyset-итерация по id: в памяти одновременно не больше batch_size кортежей
+    (первое поле — id), без OFFSET и без кэша всего queryset.
+    """
+    while True:
+        chunk = list(qs.filter(id__gt=after_id).order_by("id").values_list(*fields)[:batch_size])
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
 
 
-def _days_between_local(a, b):
-    return (b.date() - a.date()).days
+def _shard_ranges(qs, shards):
+    """Делит диапазон id кандидатов на shards непрерывных отрезков [lo, hi]."""
+    bounds = qs.aggregate(lo=Min("id"), hi=Max("id"))
+    if bounds["lo"] is None:
+        return []
+    lo, hi = bounds["lo"], bounds["hi"]
+    step = max(1, math.ceil((hi - lo + 1) / max(1, shards)))
+    return [(start, min(start + step - 1, hi)) for start in range(lo, hi + 1, step)]
 
 
-def _send_tg(chat_id, text):
-    if not BOT_TOKEN or not chat_id:
-        return
-    try:
-        requests.get(
-            f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage",
-            params={"chat_id": chat_id, "text": text},
-            timeout=5,
-        )
-    except requests.RequestException:
-        pass
+def enqueue_notifications(habit_ids, kind, slot) -> int:
+    """
+    Общая точка постановки напоминаний (сканы и демон habits.timer).
+    Кладёт уведомления в outbox и возвращает, сколько добавлено: уже стоящие
+    в очереди на этот слот (повтор при догонке) не считаются и не вставляются.
+    ignore_conflicts остаётся страховкой от гонки с параллельной вставкой.
+    """
+    if not habit_ids:
+        return 0
+    queued = set(
+        Notification.objects.filter(kind=kind, slot=slot, habit_id__in=habit_ids).values_list("habit_id", flat=True)
+    )
+    new = [hid for hid in habit_ids if hid not in queued]
+    Notification.objects.bulk_create(
+        [Notification(habit_id=hid, kind=kind, slot=slot, next_attempt_at=slot) for hid in new],
+        ignore_conflicts=True,
+    )
+    return len(new)
 
 
-def _is_due_today(habit, now_local):
+WATERMARK = {"name": "send_due_habits", "run_key": "watermark"}
+
+
+def _due_window(now):
     """
-    Напоминать сегодня, если:
-      - ни разу не выполнялась; или
-      - прошло >= periodicity_days дней с последнего выполнения.
+    Окно минут [start, end] для send_due_habits: от минуты после водяного знака
+    (последней обработанной) до текущей, но не больше HABITS_MAX_CATCHUP_MINUTES назад.
+    Пустое окно (start > end) — эта минута уже обработана.
     """
-    if habit.last_performed_at is None:
-        return True
-    last_local = timezone.localtime(habit.last_performed_at)
-    return _days_between_local(last_local, now_local) >= habit.periodicity_days
+    end = now.replace(second=0, microsecond=0)
+    mark = ScanCheckpoint.objects.filter(**WATERMARK).values_list("watermark", flat=True).first()
+    if mark is None:
+        return end, end
 
+    start = mark + timedelta(minutes=1)
+    earliest = end - timedelta(minutes=min(settings.HABITS_MAX_CATCHUP_MINUTES, MINUTES_PER_DAY - 1))
+    if start < earliest:
+        logger.warning("send_due_habits: skipping %s..%s, beyond max catch-up", start, earliest)
+        start = earliest
+    return start, end
 
-@shared_task
-def send_due_habits():
+
+def _advance_watermark(end, fence=0):
+    """
+    Сдвигает водяной знак вперёд (назад — никогда) и только от имени запуска
+    с не устаревшим fencing-токеном.
+    """
+    checkpoint, _ = ScanCheckpoint.objects.get_or_create(**WATERMARK)
+    ScanCheckpoint.objects.filter(
+        Q(watermark__isnull=True) | Q(watermark__lt=end), id=checkpoint.id, fence__lte=fence
+    ).update(watermark=end, fence=fence, updated_at=timezone.now())
+
+
+def _save_progress(checkpoint, fence, *fields):
     """
-    В минуту X:Y напоминаем о привычках, которые должны выполняться сегодня.
-    Тексты — через наш ручной перевод (как в боте).
+    Fenced-запись чекпоинта: если аренду уже получил запуск с большим токеном
+    и записал прогресс, этот (устаревший) запуск прерывается через LockLost.
     """
-    now = timezone.localtime()
-    qs = Habit.objects.select_related("user").filter(
-        time__hour=now.hour, time__minute=now.minute
+    checkpoint.updated_at = timezone.now()
+    updated = ScanCheckpoint.objects.filter(id=checkpoint.id, fence__lte=fence).update(
+        fence=fence, updated_at=checkpoint.updated_at, **{f: getattr(checkpoint, f) for f in fields}
     )
+    if not updated:
+        raise LockLost(f"{checkpoint}: fence {fence} is stale")
+    checkpoint.fence = fence
 
-    for h in qs:
-        user = h.user
-        now_local = timezone.now().astimezone(_user_tz(user))
-        if not _is_due_today(h, now_local):
-            continue
 
-        chat_id = getattr(user, "telegram_chat_id", None)
-        if not chat_id:
-            continue
+def _fire_slot(end, minute):
+    """Последний момент окна, заканчивающегося в end, с минутой суток minute (UTC)."""
+    return end - timedelta(minutes=(utc_minute(end) - minute) % MINUTES_PER_DAY)
+
+
+def _due_queryset(start, end):
+    lo, hi = utc_minute(start), utc_minute(end)
+    if lo <= hi:
+        minutes = Q(fire_minute__range=(lo, hi))
+    else:  # окно переходит через полночь UTC
+        minutes = Q(fire_minute__gte=lo) | Q(fire_minute__lte=hi)
+    return Habit.objects.filter(minutes, next_due_at__lte=end, user__telegram_chat_id__isnull=False)
+
+
+def _overdue_queryset(now):
+    return Habit.objects.filter(overdue_at__lte=now, user__telegram_chat_id__isnull=False)
+
+
+def _overdue_slot(now):
+    return local_midnight(timezone.localdate(now), timezone.get_current_timezone())
+
+
+def _due_message(h) -> str:
+    return _tr(
+        h.user,
+        ru="⏰ Напоминание: {action} @ {time} — /done_{id}",
+        es="⏰ Recordatorio: {action} @ {time} — /done_{id}",
+        en="⏰ Habit reminder: {action} @ {time} — /done_{id}",
+    ).format(action=_short(h.action), time=h.time.strftime("%H:%M"), id=h.id)
 
-        msg = _tr(
-            user,
-            ru="⏰ Напоминание: {action} @ {time} — /done_{id}",
-            es="⏰ Recordatorio: {action} @ {time} — /done_{id}",
-            en="⏰ Habit reminder: {action} @ {time} — /done_{id}",
-        ).format(action=h.action, time=h.time.strftime("%H:%M"), id=h.id)
 
-        _send_tg(chat_id, msg)
+def _overdue_message(h) -> str:
+    return _tr(
+        h.user,
+        ru="⚠️ Привычка просрочена (> {days} дней): {action}",
+        es="⚠️ Hábito atrasado (> {days} días): {action}",
+        en="⚠️ Habit overdue (> {days} days): {action}",
+    ).format(days=h.periodicity_days, action=_short(h.action))
+
+
+def _scan_due(start, end, lo=None, hi=None) -> Counter:
+    qs = _due_queryset(start, end)
+    if lo is not None:
+        qs = qs.filter(id__range=(lo, hi))
+
+    counts = Counter(queued=0)
+    fields = ("id", "fire_minute", "next_due_at")
+    for chunk in _iter_chunks(qs, settings.HABITS_SCAN_BATCH_SIZE, fields=fields):
+        # Слот — минута окна, на которую приходится напоминание; к ней привычка
+        # уже должна была стать due (иначе при догонке напомним «задним числом»).
+        by_slot = defaultdict(list)
+        for habit_id, minute, next_due_at in chunk:
+            slot = _fire_slot(end, minute)
+            if next_due_at <= slot:
+                by_slot[slot].append(habit_id)
+        for slot, ids in by_slot.items():
+            counts["queued"] += enqueue_notifications(ids, Notification.Kind.DUE, slot)
+    return counts
+
+
+def _scan_overdue(now, checkpoint, batch_size, fence=0) -> Counter:
+    qs = _overdue_queryset(now)
+    if checkpoint.upper_id is not None:
+        qs = qs.filter(id__lte=checkpoint.upper_id)
+
+    slot = _overdue_slot(now)
+    counts = Counter(queued=0)
+    for chunk in _iter_chunks(qs, batch_size, after_id=checkpoint.last_id):
+        counts["queued"] += enqueue_notifications([row[0] for row in chunk], Notification.Kind.OVERDUE, slot)
+
+        checkpoint.last_id = chunk[-1][0]
+        _save_progress(checkpoint, fence, "last_id")
+
+    checkpoint.completed_at = timezone.now()
+    _save_progress(checkpoint, fence, "completed_at")
+    return counts
+
+
+def _plan_overdue_shards(run_key, now, shards):
+    """
+    Чекпоинты шардов запуска run_key. Границы шардов фиксируются при первом
+    запуске, поэтому перезапуск продолжает те же диапазоны, а не пересчитывает их.
+    """
+    if shards <= 1:
+        checkpoint, _ = ScanCheckpoint.objects.get_or_create(name="notify_overdue", run_key=run_key)
+        return [checkpoint]
+
+    planned = list(
+        ScanCheckpoint.objects.filter(name="notify_overdue", run_key__startswith=f"{run_key}/").order_by("id")
+    )
+    if planned:
+        return planned
+    for i, (lo, hi) in enumerate(_shard_ranges(_overdue_queryset(now), shards)):
+        checkpoint, _ = ScanCheckpoint.objects.get_or_create(
+            name="notify_overdue",
+            run_key=f"{run_key}/{i}",
+            defaults={"last_id": lo - 1, "upper_id": hi},
+        )
+        planned.append(checkpoint)
+    return planned
 
 
 @shared_task
-def notify_overdue():
+@singleton()
+def send_due_habits(fence=0):
+    """
+    Ставим в outbox напоминания о привычках, которые должны выполняться сегодня
+    и чья минута (UTC) попала в окно [водяной знак, сейчас]. Отбор — диапазонный
+    запрос по индексу (fire_minute, next_due_at).
+
+    Если beat опоздал или воркеры стояли, пропущенные минуты обрабатываются
+    следующим запуском (не дальше HABITS_MAX_CATCHUP_MINUTES); повторы
+    отсекает уникальный слот outbox. Водяной знак сдвигается только после
+    успешного сканирования.
+
+    При HABITS_SCAN_SHARDS > 1 задача только координирует: делит кандидатов
+    на диапазоны id и раздаёт их воркерам через chord.
+
+    Одновременно работает один запуск (аренда habits.locks); пересекающиеся
+    пропускаются — их минуты догонит следующий запуск по водяному знаку.
+    """
+    start, end = _due_window(timezone.now())
+    if start > end:
+        return {"queued": 0}
+
+    shards = settings.HABITS_SCAN_SHARDS
+    if shards <= 1:
+        counts = _scan_due(start, end)
+        _advance_watermark(end, fence)
+        deliver_notifications.delay()
+        return dict(counts)
+
+    ranges = _shard_ranges(_due_queryset(start, end), shards)
+    if not ranges:
+        _advance_watermark(end, fence)
+        return {"queued": 0}
+    header = group(scan_due_shard.s(start.isoformat(), end.isoformat(), lo, hi) for lo, hi in ranges)
+    chord(header)(collect_scan_counts.s("send_due_habits", watermark=end.isoformat(), fence=fence))
+    # аренду держим до конца шардов — её снимет collect_scan_counts
+    return Handoff(shards=len(ranges))
+
+
+@shared_task
+@singleton()
+def notify_overdue(run_key=None, batch_size=None, fence=0):
     """
     Просрочено, если:
       - last_performed_at is None; ИЛИ
       - прошло > periodicity_days дней.
+    Оба условия материализованы в overdue_at, так что это диапазонный запрос.
+
+    Идём пачками по id, кладём уведомления в outbox и после каждой пачки
+    сохраняем ScanCheckpoint: перезапуск с тем же run_key (по умолчанию —
+    текущая дата) продолжит с места остановки, а завершённый запуск повторно
+    ничего не поставит в очередь.
+    При HABITS_SCAN_SHARDS > 1 у каждого шарда свой чекпоинт.
+    Пересекающиеся запуски пропускаются; запись чекпоинтов защищена fencing-токеном.
     """
-    timezone.localtime()
-    qs = Habit.objects.select_related("user").all()
+    now = timezone.now()
+    run_key = run_key or timezone.localdate(now).isoformat()
+    batch_size = batch_size or settings.HABITS_SCAN_BATCH_SIZE
+    shards = settings.HABITS_SCAN_SHARDS
 
-    for h in qs:
-        user = h.user
-        now_local = timezone.now().astimezone(_user_tz(user))
+    pending = [c for c in _plan_overdue_shards(run_key, now, shards) if not c.completed_at]
+    if shards <= 1:
+        counts = _merge_counts(_scan_overdue(now, checkpoint, batch_size, fence) for checkpoint in pending)
+        deliver_notifications.delay()
+        return dict(counts)
 
-        if h.last_performed_at is None:
-            overdue = True
-        else:
-            last_local = timezone.localtime(h.last_performed_at)
-            overdue = _days_between_local(last_local, now_local) > h.periodicity_days
+    if not pending:
+        return {"queued": 0}
+    header = group(scan_overdue_shard.s(now.isoformat(), c.id, batch_size, fence) for c in pending)
+    chord(header)(collect_scan_counts.s("notify_overdue", fence=fence))
+    return Handoff(shards=len(pending))
 
-        if not overdue:
-            continue
 
-        chat_id = getattr(user, "telegram_chat_id", None)
-        if not chat_id:
+@shared_task
+def scan_due_shard(start_iso, end_iso, lo, hi):
+    return dict(_scan_due(datetime.fromisoformat(start_iso), datetime.fromisoformat(end_iso), lo, hi))
+
+
+@shared_task
+def scan_overdue_shard(now_iso, checkpoint_id, batch_size, fence=0):
+    checkpoint = ScanCheckpoint.objects.get(id=checkpoint_id)
+    if checkpoint.completed_at:
+        return {"queued": 0}
+    return dict(_scan_overdue(datetime.fromisoformat(now_iso), checkpoint, batch_size, fence))
+
+
+def _merge_counts(results) -> Counter:
+    """Сумма счётчиков по всем ключам (queued, deduplicated и т. п.) из результатов шардов."""
+    counts = Counter(queued=0)
+    for result in results:
+        counts.update(result)
+    return counts
+
+
+@shared_task
+def collect_scan_counts(results, name, watermark=None, fence=0):
+    """
+    Колбэк chord: итог шардов, водяной знак и снятие аренды координатора name.
+    Счётчики шардов складываются по всем ключам, а не только queued.
+    """
+    try:
+        counts = _merge_counts(results)
+        logger.info("%s: %s (%d shards)", name, dict(counts), len(results))
+        if watermark:
+            _advance_watermark(datetime.fromisoformat(watermark), fence)
+        deliver_notifications.delay()
+        return dict(counts)
+    finally:
+        if fence:
+            release_lease(name, fence)
+
+
+def _claim_notifications(batch_size, now):
+    """
+    Забирает пачку уведомлений, которым пора уходить. SKIP LOCKED позволяет
+    нескольким воркерам доставки работать параллельно; «зависшие» в SENDING
+    после падения воркера забираются повторно по таймауту.
+    """
+    stale = now - timedelta(seconds=settings.NOTIFICATION_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        ids = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Notification.Status.PENDING, next_attempt_at__lte=now)
+                | Q(status=Notification.Status.SENDING, claimed_at__lt=stale)
+            )
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        Notification.objects.filter(id__in=ids).update(
+            status=Notification.Status.SENDING, claimed_at=now, attempts=F("attempts") + 1
+        )
+    return list(Notification.objects.filter(id__in=ids).select_related("habit__user"))
+
+
+def _due_header(user) -> str:
+    return _tr(user, ru="⏰ Напоминания:", es="⏰ Recordatorios:", en="⏰ Habit reminders:")
+
+
+def _due_line(h) -> str:
+    return f"• {_short(h.action)} @ {h.time.strftime('%H:%M')} — /done_{h.id}"
+
+
+def _overdue_header(user) -> str:
+    return _tr(user, ru="⚠️ Просроченные привычки:", es="⚠️ Hábitos atrasados:", en="⚠️ Overdue habits:")
+
+
+def _overdue_line(h) -> str:
+    return _tr(
+        h.user,
+        ru="• {action} (> {days} дней) — /done_{id}",
+        es="• {action} (> {days} días) — /done_{id}",
+        en="• {action} (> {days} days) — /done_{id}",
+    ).format(action=_short(h.action), days=h.periodicity_days, id=h.id)
+
+
+# вид -> (отдельное сообщение, заголовок дайджеста, строка дайджеста)
+_RENDERERS = {
+    Notification.Kind.DUE: (_due_message, _due_header, _due_line),
+    Notification.Kind.OVERDUE: (_overdue_message, _overdue_header, _overdue_line),
+}
+
+
+def _split_digests(items, header, line):
+    """
+    Делит уведомления на дайджесты: в каждом не больше DIGEST_MAX_ITEMS строк
+    и текст не длиннее TELEGRAM_MAX_TEXT. Возвращает пары (уведомления, строки).
+    """
+    part, lines, length = [], [], len(header)
+    for n in items:
+        text = line(n.habit)
+        if part and (len(part) >= DIGEST_MAX_ITEMS or length + 1 + len(text) > TELEGRAM_MAX_TEXT):
+            yield part, lines
+            part, lines, length = [], [], len(header)
+        part.append(n)
+        lines.append(text)
+        length += 1 + len(text)
+    if part:
+        yield part, lines
+
+
+def _coalesce(batch):
+    """
+    Склеивает уведомления одного пользователя и вида в один дайджест.
+    Возвращает пары (уведомления, (chat_id, text)) — по одной на сообщение.
+    """
+    groups = defaultdict(list)
+    for n in batch:
+        groups[(n.habit.user_id, n.kind)].append(n)
+
+    for (_, kind), items in groups.items():
+        single, header, line = _RENDERERS[kind]
+        user = items[0].habit.user
+        for part, lines in _split_digests(items, header(user), line):
+            text = single(part[0].habit) if len(part) == 1 else "\n".join([header(user), *lines])
+            yield part, (user.telegram_chat_id, text)
+
+
+def _settle(parts, results, now, counts):
+    """
+    Раскладывает результаты отправки: успех — SENT; 429/5xx/таймаут — обратно
+    в PENDING с отложенной попыткой; прочее или исчерпанные попытки — DEAD.
+    Возвращает ближайшую задержку повтора (или None).
+    """
+    sent, next_retry = [], None
+    for part, result in zip(parts, results):
+        ids = [n.id for n in part]
+        if result.ok:
+            sent.extend(ids)
             continue
 
-        msg = _tr(
-            user,
-            ru="⚠️ Привычка просрочена (> {days} дней): {action}",
-            es="⚠️ Hábito atrasado (> {days} días): {action}",
-            en="⚠️ Habit overdue (> {days} days): {action}",
-        ).format(days=h.periodicity_days, action=h.action)
+        attempts = max(n.attempts for n in part)
+        if result.retryable and attempts < settings.NOTIFICATION_MAX_ATTEMPTS:
+            delay = retry_delay(
+                result, attempts, settings.NOTIFICATION_BACKOFF_BASE, settings.NOTIFICATION_BACKOFF_CAP
+            )
+            Notification.objects.filter(id__in=ids).update(
+                status=Notification.Status.PENDING,
+                next_attempt_at=now + timedelta(seconds=delay),
+                last_error=result.error,
+            )
+            next_retry = delay if next_retry is None else min(next_retry, delay)
+            counts["retried"] += len(ids)
+        else:
+            Notification.objects.filter(id__in=ids).update(
+                status=Notification.Status.DEAD, last_error=result.error
+            )
+            counts["dead"] += len(ids)
+
+    Notification.objects.filter(id__in=sent).update(status=Notification.Status.SENT, sent_at=now)
+    counts["sent"] += len(sent)
+    return next_retry
+
+
+@shared_task
+def deliver_notifications(batch_size=None):
+    """
+    Доставляет уведомления из outbox пачками через пуловый отправитель
+    и отмечает их отправленными. Несколько уведомлений одного пользователя
+    уходят одним сообщением-дайджестом. Можно запускать на отдельных воркерах.
+
+    Повторы не ждут в цикле: уведомление откладывается до next_attempt_at,
+    а к ближайшему сроку ставится отложенный запуск этой же задачи.
+    Без BOT_TOKEN уведомления не забираются вовсе и остаются в outbox.
+    """
+    batch_size = batch_size or settings.HABITS_SCAN_BATCH_SIZE
+    counts = Counter(sent=0, retried=0, dead=0, messages=0)
+    sender = get_sender()
+    if not sender.token:
+        # ошибка конфигурации: не тратим попытки, уведомления ждут в outbox
+        logger.error("BOT_TOKEN is not set, notifications are not delivered")
+        return dict(counts)
+    next_retry = None
+    while True:
+        now = timezone.now()
+        batch = _claim_notifications(batch_size, now)
+        if not batch:
+            break
+
+        parts, messages = zip(*_coalesce(batch))
+        results = sender.send_batch(messages)
+        delay = _settle(parts, results, now, counts)
+        if delay is not None:
+            next_retry = delay if next_retry is None else min(next_retry, delay)
+        counts["messages"] += len(messages)
+
+    if next_retry is not None:
+        deliver_notifications.apply_async(countdown=next_retry)
+    return dict(counts)
 
-        _send_tg(chat_id, msg)
+
+@shared_task
+def purge_notifications():
+    """
+    Удаляет отправленные уведомления старше NOTIFICATION_RETENTION_DAYS и
+    завершённые чекпоинты сканирований старше HABITS_CHECKPOINT_RETENTION_DAYS
+    (у каждого запуска и шарда свой run_key, сами они не удаляются).
+    Водяной знак send_due_habits не трогается.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(days=settings.NOTIFICATION_RETENTION_DAYS)
+    notifications, _ = Notification.objects.filter(status=Notification.Status.SENT, sent_at__lt=cutoff).delete()
+    cutoff = now - timedelta(days=settings.HABITS_CHECKPOINT_RETENTION_DAYS)
+    checkpoints, _ = ScanCheckpoint.objects.filter(completed_at__lt=cutoff).exclude(**WATERMARK).delete()
+    return {"notifications": notifications, "checkpoints": checkpoints}
+
+
+@shared_task
+def resync_fire_minutes():
+    """
+    Держит fire_minute равным минуте ближайшего срабатывания (см.
+    scheduling.fire_minute). Срабатывания, ещё попадающие в окно догона
+    send_due_habits, считаются ближайшими, чтобы их минута не уехала.
+
+    Если в ближайшие сутки у пояса нет перехода на летнее/зимнее время —
+    один UPDATE на пояс. Иначе часть привычек сработает до перехода, часть
+    после: смещение считается для каждого различного времени привычек, и
+    на каждое смещение — свой UPDATE.
+    """
+    ref = timezone.now() - timedelta(minutes=settings.HABITS_MAX_CATCHUP_MINUTES)
+    User = get_user_model()
+    updated = 0
+    for tzname in User.objects.values_list("timezone", flat=True).distinct():
+        tz = tz_from_name(tzname)
+        habits = Habit.objects.filter(user__timezone=tzname)
+        offset = utc_offset_minutes(tz, ref)
+        if offset == utc_offset_minutes(tz, ref + timedelta(days=1)):
+            expr = fire_minute_expression(offset)
+            updated += habits.exclude(fire_minute=expr).update(fire_minute=expr)
+            continue
+        by_minute = defaultdict(list)
+        for local_time in habits.values_list("time", flat=True).distinct():
+            by_minute[fire_minute(local_time, tz, ref)].append(local_time)
+        for minute, times in by_minute.items():
+            updated += (
+                habits.filter(time__in=times)
+                .exclude(fire_minute=minute)
+                .update(fire_minute=minute)
+            )
+    return updated
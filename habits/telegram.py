@@ -0,0 +1,122 @@
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .ratelimit import BULK, get_limiter
+
+BOT_TOKEN = os.getenv("BOT_TOKEN")
+API_URL = "https://api.telegram.org/bot{token}/{method}"
+
+
+@dataclass
+class SendResult:
+    chat_id: int
+    ok: bool
+    status: int | None = None
+    error: str = ""
+    retry_after: float | None = None
+    # ошибка, которую повтор не исправит (например, не задан BOT_TOKEN)
+    permanent: bool = False
+
+    @property
+    def retryable(self) -> bool:
+        """429, 5xx и сетевые ошибки/таймауты — временные; прочие 4xx и permanent — нет."""
+        if self.ok or self.permanent:
+            return False
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+def retry_delay(result: SendResult, attempt: int, base: float, cap: float) -> float:
+    """
+    Пауза перед следующей попыткой: retry_after от Telegram, если он есть,
+    иначе экспоненциальный backoff с джиттером (половина интервала — случайная).
+    """
+    if result.retry_after is not None:
+        return max(1.0, result.retry_after) + random.uniform(0, 1)
+    delay = min(cap, base * 2 ** max(0, attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TelegramSender:
+    """
+    Отправка сообщений в Telegram из задач Celery: одна requests.Session
+    с пулом keep-alive соединений и ограниченное число параллельных запросов.
+    """
+
+    def __init__(self, token, concurrency=8, timeout=5.0):
+        self.token = token
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.mount(
+            "https://", HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+        )
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tg-send")
+
+    def url(self, method: str) -> str:
+        return API_URL.format(token=self.token, method=method)
+
+    def send(self, chat_id, text) -> SendResult:
+        if not self.token:
+            return SendResult(chat_id, ok=False, error="BOT_TOKEN is not set", permanent=True)
+        # Общий с ботом лимит Telegram; не дождались — как 429, повтор через outbox.
+        wait = get_limiter().acquire(chat_id, BULK, timeout=settings.TELEGRAM_BULK_MAX_WAIT)
+        if wait:
+            return SendResult(chat_id, ok=False, status=429, error="rate limited", retry_after=wait)
+        try:
+            resp = self.session.post(
+                self.url("sendMessage"),
+                json={"chat_id": chat_id, "text": text},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as exc:
+            return SendResult(chat_id, ok=False, error=str(exc))
+        if resp.ok:
+            return SendResult(chat_id, ok=True, status=resp.status_code)
+        return SendResult(
+            chat_id,
+            ok=False,
+            status=resp.status_code,
+            error=resp.text[:200],
+            retry_after=_retry_after(resp),
+        )
+
+    def send_batch(self, messages) -> list[SendResult]:
+        """Отправляет пачку (chat_id, text) параллельно; результаты — в порядке пачки."""
+        return list(self._executor.map(lambda m: self.send(*m), messages))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+
+def _retry_after(resp):
+    if resp.status_code != 429:
+        return None
+    try:
+        return float(resp.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender() -> TelegramSender:
+    """Общий на процесс отправитель (создаётся лениво — уже после fork воркера)."""
+    global _sender
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                _sender = TelegramSender(
+                    BOT_TOKEN,
+                    concurrency=settings.TELEGRAM_SEND_CONCURRENCY,
+                    timeout=settings.TELEGRAM_SEND_TIMEOUT,
+                )
+    return _sender
@@ -0,0 +1,174 @@
+"""
+Событийный планировщик напоминаний (процесс reminder_scheduler.py).
+
+Ближайшие срабатывания всех привычек лежат в min-куче в памяти; процесс
+спит до ближайшего из них или до события из Redis pub/sub (habits.events)
+и в момент срабатывания ставит напоминание в тот же outbox, что и
+send_due_habits. Слот outbox — минута срабатывания, поэтому страховочный
+send_due_habits из beat не создаёт дублей.
+"""
+
+import heapq
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .events import CHANNEL, get_client
+from .models import Habit, Notification
+from .scheduling import next_fire_at, tz_from_name
+from .tasks import deliver_notifications, enqueue_notifications
+
+logger = logging.getLogger(__name__)
+
+PLAN_FIELDS = ("id", "time", "next_due_at", "user__timezone", "user_id")
+
+
+class TimerHeap:
+    """
+    Min-куча таймеров по ключу с ленивой отменой: перепланирование и отмена —
+    O(log n) / O(1), устаревшие записи выбрасываются при извлечении.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, at):
+        self._entries[key] = at
+        heapq.heappush(self._heap, (at, key))
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [(at, key) for key, at in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def cancel(self, key):
+        self._entries.pop(key, None)
+
+    def next_at(self):
+        while self._heap and self._entries.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Снимает с кучи все таймеры со временем <= now: список (key, at)."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, key = heapq.heappop(self._heap)
+            if self._entries.get(key) == at:
+                del self._entries[key]
+                due.append((key, at))
+        return due
+
+
+class ReminderScheduler:
+    """
+    Держит в куче следующее срабатывание каждой привычки пользователей
+    с Telegram. БД читается только при старте, по событиям и раз в
+    reload_interval (страховка от потерянных сообщений pub/sub).
+    """
+
+    def __init__(self, reload_interval=3600, chunk_size=2000):
+        self.reload_interval = timedelta(seconds=reload_interval)
+        self.chunk_size = chunk_size
+        self.timers = TimerHeap()
+        self.user_habits = defaultdict(set)
+        self.loaded_at = None
+
+    def _rows(self, **filters):
+        return (
+            Habit.objects.filter(user__telegram_chat_id__isnull=False, **filters)
+            .values_list(*PLAN_FIELDS)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+    def _plan(self, row, not_before):
+        habit_id, local_time, next_due_at, tzname, user_id = row
+        if next_due_at is not None and next_due_at > not_before:
+            not_before = next_due_at
+        self.timers.schedule(habit_id, next_fire_at(local_time, tz_from_name(tzname), not_before))
+        self.user_habits[user_id].add(habit_id)
+
+    def _forget(self, habit_ids):
+        for habit_id in habit_ids:
+            self.timers.cancel(habit_id)
+
+    def load(self, now=None):
+        """Полная (пере)загрузка расписания."""
+        now = now or timezone.now()
+        self.timers = TimerHeap()
+        self.user_habits = defaultdict(set)
+        for row in self._rows():
+            self._plan(row, now)
+        self.loaded_at = now
+        logger.info("reminder scheduler: %d habits planned", len(self.timers))
+
+    def apply(self, event, now=None):
+        """Применяет событие habits.events: перечитывает только затронутые привычки."""
+        now = now or timezone.now()
+        if "user" in event:
+            stale = self.user_habits.pop(event["user"], set())
+            rows = list(self._rows(user_id=event["user"]))
+        else:
+            stale = {event["habit"]}
+            rows = [] if event.get("deleted") else list(self._rows(id=event["habit"]))
+        self._forget(stale - {row[0] for row in rows})
+        for row in rows:
+            self._plan(row, now)
+
+    def fire(self, now=None):
+        """
+        Ставит в outbox всё, что сработало к now, и планирует следующие
+        срабатывания. Перед постановкой состояние перепроверяется по БД.
+        """
+        now = now or timezone.now()
+        due = dict(self.timers.pop_due(now))
+        if not due:
+            return 0
+
+        by_slot = defaultdict(list)
+        rows = list(self._rows(id__in=list(due)))
+        for row in rows:
+            habit_id, next_due_at = row[0], row[2]
+            at = due[habit_id]
+            if next_due_at is not None and next_due_at <= at:
+                by_slot[at.replace(second=0, microsecond=0)].append(habit_id)
+            self._plan(row, at + timedelta(minutes=1))
+        self._forget(set(due) - {row[0] for row in rows})
+
+        queued = sum(enqueue_notifications(ids, Notification.Kind.DUE, slot) for slot, ids in by_slot.items())
+        if queued:
+            deliver_notifications.delay()
+        return queued
+
+    def seconds_until_next(self, now):
+        deadline = self.loaded_at + self.reload_interval
+        next_at = self.timers.next_at()
+        if next_at is not None and next_at < deadline:
+            deadline = next_at
+        return max(0.0, (deadline - now).total_seconds())
+
+    def run(self):
+        pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        self.load()
+        while True:
+            now = timezone.now()
+            if now >= self.loaded_at + self.reload_interval:
+                self.load(now)
+            self.fire(now)
+
+            message = pubsub.get_message(timeout=min(self.seconds_until_next(now), 60.0))
+            while message:
+                if message["type"] == "message":
+                    self.apply(json.loads(message["data"]))
+                message = pubsub.get_message(timeout=0)
+            close_old_connections()
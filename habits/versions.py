@@ -0,0 +1,80 @@
+"""
+Версия привычек пользователя для условных GET и кэша ответов API.
+
+Любая запись в привычки пользователя — через API, бота или задачи —
+после коммита увеличивает его версию в кэше Django (сигналы Habit и
+HabitQuerySet.check_in). Из версии строится ETag: совпал с If-None-Match —
+отвечаем 304, не трогая таблицу привычек. Сериализованные страницы списка
+кэшируются под ключом с версией, поэтому старые записи просто перестают
+читаться и истекают по HABITS_API_CACHE_TTL.
+
+Работает только при HABITS_API_CACHE (общий кэш в Redis): в кэше внутри
+процесса версию, изменённую ботом, Celery или другим воркером web, не видно.
+Без него, как и при недоступности кэша, API отвечает как раньше — без ETag и кэша.
+
+Если версия вытеснена из кэша, она заводится заново от текущего времени в
+наносекундах — так новый ETag не совпадёт ни с одним из выданных ранее.
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _key(user_id):
+    return f"habits:version:{user_id}"
+
+
+def get_version(user_id):
+    """Текущая версия привычек пользователя или None, если общего кэша нет или он недоступен."""
+    if not settings.HABITS_API_CACHE:
+        return None
+    try:
+        version = cache.get(_key(user_id))
+        if version is None:
+            cache.add(_key(user_id), time.time_ns(), timeout=None)
+            version = cache.get(_key(user_id))
+        return version
+    except Exception:
+        logger.warning("habits version cache unavailable", exc_info=True)
+        return None
+
+
+def _bump(user_id):
+    try:
+        cache.incr(_key(user_id))
+    except ValueError:
+        # версии ещё нет (или вытеснена) — заводим новую
+        cache.set(_key(user_id), time.time_ns(), timeout=None)
+    except Exception:
+        logger.warning("failed to bump habits version of user %s", user_id, exc_info=True)
+
+
+def bump(user_id):
+    """Увеличивает версию после коммита: до него читатели увидели бы старые данные под новой версией."""
+    if not settings.HABITS_API_CACHE:
+        return
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def etag(user_id, version):
+    return f'"habits-{user_id}-{version}"'
+
+
+def etag_matches(request, value):
+    header = request.headers.get("If-None-Match", "")
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return value in tags
+
+
+def list_cache_key(user_id, version, url):
+    digest = hashlib.sha1(url.encode()).hexdigest()
+    return f"habits:list:{user_id}:{version}:{digest}"
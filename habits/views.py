@@ -1,10 +1,16 @@
-from rest_framework import permissions, viewsets
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import permissions, status, viewsets
+from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
 
-from .models import Habit
+from . import events, versions
+from .models import SCHEDULE_FIELDS, Habit
+from .pagination import HabitPagination
 from .permissions import IsOwner
-from .serializers import HabitSerializer
+from .serializers import HabitBulkSerializer, HabitSerializer
 
 
 @api_view(["GET"])
@@ -16,9 +22,136 @@ class HabitViewSet(viewsets.ModelViewSet):
     queryset = Habit.objects.all()
     serializer_class = HabitSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwner]
+    pagination_class = HabitPagination
 
     def get_queryset(self):
         return Habit.objects.filter(user=self.request.user).order_by("id")
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    def _not_modified(self, request):
+        """Версия привычек пользователя и ETag; ответ 304, если у клиента та же версия."""
+        version = versions.get_version(request.user.pk)
+        if version is None:
+            return None, None, None
+        tag = versions.etag(request.user.pk, version)
+        if versions.etag_matches(request, tag):
+            return version, tag, Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": tag})
+        return version, tag, None
+
+    def list(self, request, *args, **kwargs):
+        version, tag, not_modified = self._not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        if version is None:
+            return super().list(request, *args, **kwargs)
+
+        key = versions.list_cache_key(request.user.pk, version, request.build_absolute_uri())
+        data = cache.get(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, data, settings.HABITS_API_CACHE_TTL)
+        return Response(data, headers={"ETag": tag})
+
+    def retrieve(self, request, *args, **kwargs):
+        version, tag, not_modified = self._not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        response = super().retrieve(request, *args, **kwargs)
+        if tag:
+            response["ETag"] = tag
+        return response
+
+    @action(detail=False, methods=["post"], serializer_class=HabitBulkSerializer)
+    @transaction.atomic
+    def bulk(self, request):
+        """
+        Пакетные create/update/delete одним запросом: всё проверяется за один проход
+        и применяется в одной транзакции (bulk_create, bulk_update, один DELETE).
+        Если хоть один элемент невалиден, не применяется ничего — ответ 400 с
+        результатом по каждому элементу (null — элемент валиден, но не применён).
+
+        Обновляемые и удаляемые строки читаются с select_for_update() в той же
+        транзакции: отметка о выполнении, пришедшая из бота между чтением и
+        bulk_update, иначе затёрлась бы старым last_performed_at.
+        """
+        batch = HabitBulkSerializer(data=request.data, context={"max_items": settings.HABITS_BULK_MAX_ITEMS})
+        batch.is_valid(raise_exception=True)
+        user, now = request.user, timezone.now()
+        ops = batch.validated_data
+
+        ids = [item.get("id") for item in ops["update"]] + ops["delete"]
+        # блокируем по порядку id (get_queryset), чтобы встречные пакеты не ждали друг друга по кругу
+        locked = self.get_queryset().select_for_update().filter(id__in=[i for i in ids if isinstance(i, int)])
+        existing = {habit.id: habit for habit in locked}
+        seen, failed = set(), False
+
+        def check_id(hid):
+            nonlocal failed
+            if hid in seen:
+                failed = True
+                return {"id": hid, "status": 400, "errors": {"id": ["Повторяется в пакете."]}}
+            seen.add(hid)
+            if hid not in existing:
+                failed = True
+                return {"id": hid, "status": 404}
+            return None
+
+        created, results = [], {"create": [], "update": [], "delete": []}
+        for item in ops["create"]:
+            serializer = HabitSerializer(data=item)
+            if serializer.is_valid():
+                habit = Habit(user=user, **serializer.validated_data)
+                habit.refresh_schedule(user=user, now=now)
+                created.append(habit)
+                results["create"].append(None)
+            else:
+                failed = True
+                results["create"].append({"status": 400, "errors": serializer.errors})
+
+        updated, update_fields = [], set(SCHEDULE_FIELDS)
+        for item in ops["update"]:
+            hid = item.get("id")
+            error = check_id(hid) if isinstance(hid, int) else {"id": hid, "status": 400, "errors": {"id": ["Нужен id."]}}
+            if error is not None:
+                failed = True
+                results["update"].append(error)
+                continue
+            habit = existing[hid]
+            serializer = HabitSerializer(habit, data=item, partial=True)
+            if not serializer.is_valid():
+                failed = True
+                results["update"].append({"id": hid, "status": 400, "errors": serializer.errors})
+                continue
+            for field, value in serializer.validated_data.items():
+                setattr(habit, field, value)
+                update_fields.add(field)
+            habit.refresh_schedule(user=user, now=now)
+            updated.append(habit)
+            results["update"].append(None)
+
+        deleted = []
+        for hid in ops["delete"]:
+            error = check_id(hid)
+            results["delete"].append(error)
+            if error is None:
+                deleted.append(hid)
+
+        if failed:
+            return Response(results, status=status.HTTP_400_BAD_REQUEST)
+
+        Habit.objects.bulk_create(created)
+        if updated:
+            Habit.objects.bulk_update(updated, sorted(update_fields))
+        if deleted:
+            Habit.objects.filter(user=user, id__in=deleted).delete()
+        if created or updated or deleted:
+            # bulk_create/bulk_update минуют сигналы
+            events.publish(user=user.pk)
+            versions.bump(user.pk)
+
+        results["create"] = [{"status": 201, "data": HabitSerializer(h).data} for h in created]
+        results["update"] = [{"id": h.id, "status": 200, "data": HabitSerializer(h).data} for h in updated]
+        results["delete"] = [{"id": hid, "status": 204} for hid in deleted]
+        return Response(results)
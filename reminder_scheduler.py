@@ -0,0 +1,30 @@
+"""
+Событийный планировщик напоминаний — замена минутного опроса send_due_habits.
+
+    python reminder_scheduler.py
+
+Нужен HABITS_EVENTS_URL (Redis): по нему web, бот и воркеры сообщают об
+изменениях привычек. send_due_habits в beat при этом остаётся страховкой
+и запускается реже (см. HABITS_TIMER_DAEMON в config/settings.py).
+"""
+
+import logging
+import os
+
+import django
+from dotenv import load_dotenv
+
+load_dotenv()
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from django.conf import settings  # noqa: E402
+
+from habits.timer import ReminderScheduler  # noqa: E402
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not settings.HABITS_EVENTS_URL:
+        raise SystemExit("HABITS_EVENTS_URL не задан")
+    ReminderScheduler(reload_interval=settings.HABITS_TIMER_RELOAD_SECONDS).run()
@@ -7,17 +7,26 @@ load_dotenv()
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 django.setup()
 
+import logging
 import re
+import sys
 from datetime import time as dt_time
+from html import escape
 from zoneinfo import ZoneInfo
 
 import telebot
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from telebot import types
+from telebot.apihelper import ApiTelegramException
 
 from habits.models import Habit
 from habits.serializers import HabitSerializer
+from tgbot.metrics import instrument, start_http_server, start_log_summary
+from tgbot.router import Router
+from tgbot.sender import install_rate_limiter
+from tgbot.state import get_state_store
+from tgbot.users import get_user_by_chat, start_invalidation_listener
 
 User = get_user_model()
 
@@ -26,23 +35,9 @@ if not BOT_TOKEN:
     raise SystemExit("BOT_TOKEN/TELEGRAM_BOT_TOKEN не задан в .env")
 
 bot = telebot.TeleBot(BOT_TOKEN, parse_mode="HTML")
+install_rate_limiter()
 
-STATE: dict[int, dict] = {}
-
-
-def get_user_by_chat(chat_id: int) -> User:
-    user, created = User.objects.get_or_create(
-        username=str(chat_id),
-        defaults={"telegram_chat_id": chat_id, "language": "en"},
-    )
-    if getattr(user, "telegram_chat_id", None) != chat_id:
-        user.telegram_chat_id = chat_id
-        user.save(update_fields=["telegram_chat_id"])
-    # дефолт языка
-    if not getattr(user, "language", None):
-        user.language = "en"
-        user.save(update_fields=["language"])
-    return user
+STATE = get_state_store()
 
 
 TR = {
@@ -102,6 +97,13 @@ TR = {
         "en": "I didn't get that. Please answer the previous question.",
     },
     "done_marked": {"ru": "Отмечено! 💪", "es": "¡Marcado! 💪", "en": "Marked! 💪"},
+    "mark_all_done": {"ru": "✅ Отметить все", "es": "✅ Marcar todos", "en": "✅ Mark all done"},
+    "done_all_marked": {"ru": "Отмечено привычек: {n} 💪", "es": "Hábitos marcados: {n} 💪", "en": "Habits marked: {n} 💪"},
+    "nothing_to_mark": {
+        "ru": "Все привычки уже выполнены сегодня.",
+        "es": "Todos los hábitos ya están hechos hoy.",
+        "en": "All habits are already done today.",
+    },
     "cannot_mark_twice": {
         "ru": "Эта привычка уже выполнена сегодня.",
         "es": "Este hábito ya está hecho hoy.",
@@ -172,10 +174,6 @@ def lang_choice_keyboard(user: User) -> types.ReplyKeyboardMarkup:
     return kb
 
 
-def is_menu_text(message: types.Message, user: User, key: str) -> bool:
-    return (message.text or "").strip() == t(user, key)
-
-
 def get_user_tzinfo(user: User):
     tzname = getattr(user, "timezone", None) or "UTC"
     try:
@@ -212,38 +210,99 @@ def validate_periodicity(s: str) -> int | None:
     return None
 
 
-def send_habits_info(chat_id: int):
-    user = get_user_by_chat(chat_id)
-    habits = list(Habit.objects.filter(user=user).order_by("time", "id"))
+HABITS_PAGE_SIZE = 8
+
 
+def render_habits_page(user: User, page: int):
+    """
+    Одна страница списка привычек: текст и общая inline-клавиатура.
+    Один запрос к БД: берём на строку больше страницы, чтобы понять, есть ли следующая
+    (для страницы за концом списка — ещё COUNT и повтор на последней).
+    """
+    qs = Habit.objects.filter(user=user).order_by("time", "id")
+    page = max(0, page)
+    habits = list(qs[page * HABITS_PAGE_SIZE:(page + 1) * HABITS_PAGE_SIZE + 1])
+    if not habits and page > 0:
+        # устаревшая (или подделанная) кнопка — сразу на последнюю страницу
+        page = max(0, qs.count() - 1) // HABITS_PAGE_SIZE
+        habits = list(qs[page * HABITS_PAGE_SIZE:(page + 1) * HABITS_PAGE_SIZE + 1])
     if not habits:
-        bot.send_message(chat_id, t(user, "no_habits_today"))
-        return
+        return t(user, "no_habits_today"), None
 
-    header = t(user, "header_today_for").format(name=(user.email or user.username))
-    bot.send_message(chat_id, header)
+    has_next = len(habits) > HABITS_PAGE_SIZE
+    habits = habits[:HABITS_PAGE_SIZE]
 
-    for h in habits[:25]:
+    lines = [t(user, "header_today_for").format(name=(user.email or user.username))]
+    kb = types.InlineKeyboardMarkup()
+    any_pending = False
+    for n, h in enumerate(habits, start=page * HABITS_PAGE_SIZE + 1):
         done = is_done_today(user, h.last_performed_at)
+        any_pending = any_pending or not done
         status_txt = t(user, "already_done") if done else t(user, "pending")
-        line = f"🎯 <b>{h.action}</b> @ {h.time.strftime('%H:%M')} — {status_txt}"
+        lines.append(f"{n}. 🎯 <b>{escape(h.action)}</b> @ {h.time.strftime('%H:%M')} — {status_txt}")
 
-        kb = types.InlineKeyboardMarkup()
+        buttons = [types.InlineKeyboardButton(f"🗑 {n}", callback_data=f"del:{h.id}:{page}")]
         if not done:
-            kb.add(
-                types.InlineKeyboardButton(t(user, "mark_done"), callback_data=f"done:{h.id}"),
-                types.InlineKeyboardButton(t(user, "delete"), callback_data=f"del:{h.id}"),
-            )
-        else:
-            kb.add(types.InlineKeyboardButton(t(user, "delete"), callback_data=f"del:{h.id}"))
+            buttons.insert(0, types.InlineKeyboardButton(f"✅ {n}", callback_data=f"done:{h.id}:{page}"))
+        kb.row(*buttons)
+
+    if any_pending:
+        # отмечает все привычки пользователя, которые пора выполнять, не только эту страницу
+        kb.row(types.InlineKeyboardButton(t(user, "mark_all_done"), callback_data=f"doneall:{page}"))
+
+    nav = []
+    if page > 0:
+        nav.append(types.InlineKeyboardButton("⬅", callback_data=f"page:{page - 1}"))
+    if has_next:
+        nav.append(types.InlineKeyboardButton("➡", callback_data=f"page:{page + 1}"))
+    if nav:
+        kb.row(*nav)
+    return "\n".join(lines), kb
 
-        bot.send_message(chat_id, line, reply_markup=kb)
+
+@instrument()
+def send_habits_info(chat_id: int):
+    user = get_user_by_chat(chat_id)
+    text, kb = render_habits_page(user, 0)
+    bot.send_message(chat_id, text, reply_markup=kb)
+
+
+def edit_habits_page(call: types.CallbackQuery, user: User, page: int):
+    """Перерисовывает список в том же сообщении, из которого пришёл callback."""
+    text, kb = render_habits_page(user, page)
+    try:
+        bot.edit_message_text(
+            text, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=kb, parse_mode="HTML"
+        )
+    except ApiTelegramException as exc:
+        if "message is not modified" not in str(exc):
+            raise
+
+
+def check_in_habit(user: User, hid: int) -> str | None:
+    """
+    Отмечает одну привычку условным UPDATE (см. HabitQuerySet.check_in), так что
+    два одновременных нажатия не отметят её дважды. Возвращает ключ TR с итогом
+    или None, если привычки нет.
+    """
+    if Habit.objects.filter(id=hid).check_in(user):
+        return "done_marked"
+    if Habit.objects.filter(id=hid, user=user).exists():
+        return "cannot_mark_twice"
+    return None
+
+
+def parse_callback(data: str) -> tuple[int, int]:
+    """'done:<id>:<page>' -> (id, page); у старых кнопок страницы нет — первая."""
+    parts = data.split(":")
+    return int(parts[1]), int(parts[2]) if len(parts) > 2 else 0
 
 
 @bot.message_handler(commands=["start", "help"])
+@instrument()
 def handle_start(message: types.Message):
     user = get_user_by_chat(message.chat.id)
-    STATE[message.chat.id] = {"step": "choose_lang_start"}
+    STATE.set(message.chat.id, {"step": "choose_lang_start"})
     bot.reply_to(
         message,
         t(user, "lang_prompt"),
@@ -252,183 +311,206 @@ def handle_start(message: types.Message):
 
 
 @bot.message_handler(commands=["habits"])
+@instrument()
 def handle_cmd_habits(message: types.Message):
     send_habits_info(message.chat.id)
 
 
-@bot.message_handler(regexp=r"^/done_\d+$")
-def handle_done_command(message: types.Message):
+DONE_COMMAND = re.compile(r"^/done_(\d+)$")
+LANG_CODES = {"lang_en": "en", "lang_es": "es", "lang_ru": "ru"}
+
+router = Router(TR)
+router.index("back", *LANG_CODES)
+
+
+@instrument()
+def handle_done_command(message: types.Message, hid: int):
     user = get_user_by_chat(message.chat.id)
+    result = check_in_habit(user, hid)
+    bot.reply_to(message, t(user, result) if result else "Error")
+
+
+@router.step("choose_lang_start", "choose_lang_menu")
+def flow_choose_lang(message: types.Message, user: User, st: dict):
+    key = router.key_for(message.text)
+    if key == "back" and st["step"] == "choose_lang_menu":
+        STATE.delete(message.chat.id)
+        bot.reply_to(message, t(user, "choose_action"), reply_markup=main_menu_keyboard(user))
+        return
+
+    if key not in LANG_CODES:
+        bot.reply_to(message, t(user, "lang_prompt"), reply_markup=lang_choice_keyboard(user))
+        return
+
+    new_code = LANG_CODES[key]
+    user.language = new_code
+    user.save(update_fields=["language"])
+    STATE.delete(message.chat.id)
+
+    bot.send_message(
+        message.chat.id,
+        t(user, f"lang_changed_{new_code}"),
+        reply_markup=main_menu_keyboard(user)
+    )
     try:
-        hid = int((message.text or "").split("_", 1)[1])
-        h = Habit.objects.get(id=hid, user=user)
+        bot.delete_message(message.chat.id, message.message_id)
     except Exception:
-        bot.reply_to(message, "Error")
+        pass
+
+
+@router.step("action")
+def flow_action(message: types.Message, user: User, st: dict):
+    text = (message.text or "").strip()
+    if not text:
+        bot.reply_to(message, t(user, "enter_action"), reply_markup=reply_kb_remove())
         return
+    st["data"]["action"] = text
+    st["step"] = "time"
+    STATE.set(message.chat.id, st)
+    bot.reply_to(message, t(user, "enter_time"))
+
 
-    if is_done_today(user, h.last_performed_at):
-        bot.reply_to(message, t(user, "cannot_mark_twice"))
+@router.step("time")
+def flow_time(message: types.Message, user: User, st: dict):
+    tval = parse_hhmm((message.text or "").strip())
+    if not tval:
+        bot.reply_to(message, t(user, "bad_time"))
         return
+    st["data"]["time"] = tval.strftime("%H:%M")
+    st["step"] = "periodicity"
+    STATE.set(message.chat.id, st)
+    bot.reply_to(
+        message,
+        t(user, "enter_periodicity"),
+        reply_markup=periodicity_choice_keyboard(user)  # ⬅ показали 1–7
+    )
 
-    h.last_performed_at = timezone.now()
-    h.save(update_fields=["last_performed_at"])
-    bot.reply_to(message, t(user, "done_marked"))
 
+@router.step("periodicity")
+def flow_periodicity(message: types.Message, user: User, st: dict):
+    data = st["data"]
+    v = validate_periodicity((message.text or "").strip())
+    if v is None:
+        bot.reply_to(
+            message,
+            t(user, "bad_periodicity"),
+            reply_markup=periodicity_choice_keyboard(user)
+        )
+        return
 
-@bot.message_handler(func=lambda m: not re.match(r"^/done_\d+$", (m.text or "")))
-def handle_menu_and_flow(message: types.Message):
-    user = get_user_by_chat(message.chat.id)
-    st = STATE.get(message.chat.id)
+    data["periodicity_days"] = v
+    serializer = HabitSerializer(data=data, context={"user": user})
+    if serializer.is_valid():
+        serializer.save()
+        bot.reply_to(message, t(user, "created"), reply_markup=main_menu_keyboard(user))
+    else:
+        bot.reply_to(message, f"❌ {serializer.errors}", reply_markup=main_menu_keyboard(user))
+    STATE.delete(message.chat.id)
 
-    if st and st.get("step"):
-        if st and st.get("step") in {"choose_lang_start", "choose_lang_menu"}:
-            txt = (message.text or "").strip()
-            code_map = {
-                t(user, "lang_en"): "en",
-                t(user, "lang_es"): "es",
-                t(user, "lang_ru"): "ru",
-            }
-            if txt == t(user, "back") and st["step"] == "choose_lang_menu":
-                STATE.pop(message.chat.id, None)
-                bot.reply_to(message, t(user, "choose_action"), reply_markup=main_menu_keyboard(user))
-                return
-
-            if txt not in code_map:
-                bot.reply_to(message, t(user, "lang_prompt"), reply_markup=lang_choice_keyboard(user))
-                return
-
-            new_code = code_map[txt]
-            user.language = new_code
-            user.save(update_fields=["language"])
-            STATE.pop(message.chat.id, None)
-
-            confirm_key = {"en": "lang_changed_en", "es": "lang_changed_es", "ru": "lang_changed_ru"}[new_code]
-
-            bot.send_message(
-                message.chat.id,
-                t(user, confirm_key),
-                reply_markup=main_menu_keyboard(user)
-            )
-            try:
-                bot.delete_message(message.chat.id, message.message_id)
-            except Exception:
-                pass
-            return
-        step = st["step"]
-        if step == "action":
-            data = st["data"]
-            text = (message.text or "").strip()
-            if not text:
-                bot.reply_to(message, t(user, "enter_action"), reply_markup=reply_kb_remove())
-                return
-            data["action"] = text
-            st["step"] = "time"
-            bot.reply_to(message, t(user, "enter_time"))
-            return
 
-        if step == "time":
-            data = st["data"]
-            tval = parse_hhmm((message.text or "").strip())
-            if not tval:
-                bot.reply_to(message, t(user, "bad_time"))
-                return
-            data["time"] = tval.strftime("%H:%M")
-            st["step"] = "periodicity"
-            bot.reply_to(
-                message,
-                t(user, "enter_periodicity"),
-                reply_markup=periodicity_choice_keyboard(user)  # ⬅ показали 1–7
-            )
-            return
+@router.action("menu_info")
+def menu_info(message: types.Message, user: User, st: dict):
+    send_habits_info(message.chat.id)
 
-        if step == "periodicity":
-            data = st["data"]
-            v = validate_periodicity((message.text or "").strip())
-            if v is None:
-                bot.reply_to(
-                    message,
-                    t(user, "bad_periodicity"),
-                    reply_markup=periodicity_choice_keyboard(user)
-                )
-                return
-
-            data["periodicity_days"] = v
-            serializer = HabitSerializer(data=data, context={"user": user})
-            if serializer.is_valid():
-                serializer.save()
-                bot.reply_to(message, t(user, "created"), reply_markup=main_menu_keyboard(user))
-                STATE.pop(message.chat.id, None)
-            else:
-                bot.reply_to(message, f"❌ {serializer.errors}", reply_markup=main_menu_keyboard(user))
-                STATE.pop(message.chat.id, None)
-            return
 
-        STATE.pop(message.chat.id, None)
-        bot.reply_to(message, t(user, "choose_action"), reply_markup=main_menu_keyboard(user))
-        return
+@router.action("menu_add")
+def menu_add(message: types.Message, user: User, st: dict):
+    STATE.set(message.chat.id, {"step": "action", "data": {}})
+    bot.reply_to(message, t(user, "enter_action"), reply_markup=reply_kb_remove())
 
-    if is_menu_text(message, user, "menu_info"):
-        send_habits_info(message.chat.id)
-        return
 
-    if is_menu_text(message, user, "menu_add"):
-        STATE[message.chat.id] = {"step": "action", "data": {}}
-        bot.reply_to(message, t(user, "enter_action"), reply_markup=reply_kb_remove())
-        return
+@router.action("menu_delete_all")
+def menu_delete_all(message: types.Message, user: User, st: dict):
+    Habit.objects.filter(user=user).delete()
+    bot.reply_to(message, t(user, "deleted_all"), reply_markup=main_menu_keyboard(user))
 
-    if is_menu_text(message, user, "menu_delete_all"):
-        Habit.objects.filter(user=user).delete()
-        bot.reply_to(message, t(user, "deleted_all"), reply_markup=main_menu_keyboard(user))
-        return
 
-    if is_menu_text(message, user, "menu_change_lang"):
-        STATE[message.chat.id] = {"step": "choose_lang_menu"}
-        bot.reply_to(message, t(user, "lang_prompt"), reply_markup=lang_choice_keyboard(user))
+@router.action("menu_change_lang")
+def menu_change_lang(message: types.Message, user: User, st: dict):
+    STATE.set(message.chat.id, {"step": "choose_lang_menu"})
+    bot.reply_to(message, t(user, "lang_prompt"), reply_markup=lang_choice_keyboard(user))
+
+
+@bot.message_handler()
+@instrument()
+def handle_menu_and_flow(message: types.Message):
+    text = message.text or ""
+    if text.startswith("/done_"):
+        match = DONE_COMMAND.match(text)
+        if match:
+            handle_done_command(message, int(match.group(1)))
+            return
+
+    user = get_user_by_chat(message.chat.id)
+    st = STATE.get(message.chat.id)
+    step = st.get("step") if st else None
+    handler = router.resolve(text, step)
+    if handler is not None:
+        handler(message, user, st)
         return
 
+    if step:
+        # неизвестный шаг (например, из старой версии бота) — сбрасываем диалог
+        STATE.delete(message.chat.id)
     bot.reply_to(message, t(user, "choose_action"), reply_markup=main_menu_keyboard(user))
 
 
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("page:"))
+@instrument()
+def handle_page_callback(call: types.CallbackQuery):
+    user = get_user_by_chat(call.message.chat.id)
+    try:
+        page = int(call.data.split(":", 1)[1])
+    except ValueError:
+        bot.answer_callback_query(call.id, show_alert=True, text="Error")
+        return
+    bot.answer_callback_query(call.id)
+    edit_habits_page(call, user, page)
+
+
 @bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("done:"))
+@instrument()
 def handle_done_callback(call: types.CallbackQuery):
-    chat_id = call.message.chat.id
-    user = get_user_by_chat(chat_id)
+    user = get_user_by_chat(call.message.chat.id)
     try:
-        hid = int(call.data.split(":", 1)[1])
-        h = Habit.objects.get(id=hid, user=user)
-    except Exception:
+        hid, page = parse_callback(call.data)
+    except ValueError:
         bot.answer_callback_query(call.id, show_alert=True, text="Error")
         return
 
-    if is_done_today(user, h.last_performed_at):
-        bot.answer_callback_query(call.id, show_alert=True, text=t(user, "cannot_mark_twice"))
-        try:
-            bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
-        except Exception:
-            pass
+    result = check_in_habit(user, hid)
+    if result is None:
+        bot.answer_callback_query(call.id, show_alert=True, text="Error")
         return
+    bot.answer_callback_query(call.id, show_alert=result != "done_marked", text=t(user, result))
+    edit_habits_page(call, user, page)
+
 
-    h.last_performed_at = timezone.now()
-    h.save(update_fields=["last_performed_at"])
-    bot.answer_callback_query(call.id, text=t(user, "done_marked"))
-    status_txt = t(user, "already_done")
+@bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("doneall:"))
+@instrument()
+def handle_done_all_callback(call: types.CallbackQuery):
+    user = get_user_by_chat(call.message.chat.id)
     try:
-        bot.edit_message_text(
-            chat_id=chat_id,
-            message_id=call.message.message_id,
-            text=re.sub(r"(—\s*)(.+)$", rf"\1{status_txt}", call.message.text),
-            parse_mode="HTML",
-        )
-    except Exception:
-        bot.edit_message_reply_markup(chat_id, call.message.message_id, reply_markup=None)
+        page = int(call.data.split(":", 1)[1])
+    except ValueError:
+        bot.answer_callback_query(call.id, show_alert=True, text="Error")
+        return
+
+    # только те, что пора выполнять: недельную привычку, сделанную вчера, не трогаем
+    marked = Habit.objects.filter(next_due_at__lte=timezone.now()).check_in(user)
+    if marked:
+        bot.answer_callback_query(call.id, text=t(user, "done_all_marked").format(n=marked))
+    else:
+        bot.answer_callback_query(call.id, show_alert=True, text=t(user, "nothing_to_mark"))
+    edit_habits_page(call, user, page)
 
 
 @bot.callback_query_handler(func=lambda c: c.data and c.data.startswith("del:"))
+@instrument()
 def handle_delete_callback(call: types.CallbackQuery):
-    chat_id = call.message.chat.id
-    user = get_user_by_chat(chat_id)
+    user = get_user_by_chat(call.message.chat.id)
     try:
-        hid = int(call.data.split(":", 1)[1])
+        hid, page = parse_callback(call.data)
         h = Habit.objects.get(id=hid, user=user)
     except Exception:
         bot.answer_callback_query(call.id, show_alert=True, text="Error")
@@ -436,22 +518,46 @@ def handle_delete_callback(call: types.CallbackQuery):
 
     h.delete()
     bot.answer_callback_query(call.id, text=t(user, "deleted_one"))
+    edit_habits_page(call, user, page)
 
-    try:
-        bot.delete_message(chat_id, call.message.message_id)
-    except Exception:
-        try:
-            bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=call.message.message_id,
-                text=f"{call.message.text}\n\n{t(user, 'deleted_one')}",
-                parse_mode="HTML"
-            )
-        except Exception:
-            pass
+
+def set_webhook():
+    """Переводит бота в режим вебхука (апдейты принимает web, см. tgbot.webhook)."""
+    from django.conf import settings
+
+    if not (settings.TELEGRAM_WEBHOOK_URL and settings.TELEGRAM_WEBHOOK_SECRET):
+        raise SystemExit("TELEGRAM_WEBHOOK_URL/TELEGRAM_WEBHOOK_SECRET не заданы в .env")
+    bot.remove_webhook()
+    bot.set_webhook(
+        url=settings.TELEGRAM_WEBHOOK_URL,
+        secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+        max_connections=settings.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+    )
 
 
 if __name__ == "__main__":
     if not BOT_TOKEN:
         raise SystemExit("BOT_TOKEN/TELEGRAM_BOT_TOKEN не задан в .env")
-    bot.infinity_polling(skip_pending=True)
+    from django.conf import settings
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    start_log_summary(settings.BOT_METRICS_LOG_INTERVAL)
+    if sys.argv[1:] != ["set-webhook"]:
+        start_http_server(settings.BOT_METRICS_PORT, settings.BOT_METRICS_TOKEN)
+        start_invalidation_listener()
+    if sys.argv[1:] == ["set-webhook"]:
+        set_webhook()
+    elif sys.argv[1:] == ["threaded"]:
+        from tgbot.dispatch import SeenUpdates
+        from tgbot.threaded import run
+
+        run(
+            bot,
+            BOT_TOKEN,
+            workers=settings.BOT_THREADED_WORKERS,
+            max_pending=settings.BOT_THREADED_MAX_PENDING,
+            done=SeenUpdates(settings.BOT_STATE_URL),
+        )
+    else:
+        bot.remove_webhook()
+        bot.infinity_polling(skip_pending=True)
@@ -9,6 +9,44 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 django.setup()
 
 
+@pytest.fixture(autouse=True)
+def celery_eager(monkeypatch):
+    from config.celery import app
+
+    monkeypatch.setattr(app.conf, "task_always_eager", True)
+    monkeypatch.setattr(app.conf, "task_eager_propagates", True)
+
+
+@pytest.fixture(autouse=True)
+def task_locks(monkeypatch):
+    """Аренды периодических задач — в памяти, свои на каждый тест."""
+    from habits.locks import MemoryLockBackend
+
+    backend = MemoryLockBackend()
+    monkeypatch.setattr("habits.locks._backend", backend)
+    return backend
+
+
+@pytest.fixture(autouse=True)
+def rate_limiter(monkeypatch):
+    """Лимит Telegram — корзины в памяти, свои на каждый тест."""
+    from habits.ratelimit import MemoryBuckets, RateLimiter
+
+    limiter = RateLimiter(MemoryBuckets())
+    monkeypatch.setattr("habits.ratelimit._limiter", limiter)
+    return limiter
+
+
+@pytest.fixture(autouse=True)
+def django_cache():
+    """Кэш Django (версии привычек, страницы API) — пустой в каждом тесте."""
+    from django.core.cache import cache
+
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
 @pytest.fixture
 def user(db):
     U = get_user_model()
@@ -42,3 +80,40 @@ def api_client(user):
 @pytest.fixture
 def anon_client():
     return APIClient()
+
+
+class FakeSender:
+    """Подменяет habits.telegram.TelegramSender: запоминает сообщения вместо отправки."""
+
+    def __init__(self):
+        self.token = "123:test"
+        self.sent = []
+        self.fail_after = None
+        # Очередь заготовленных ответов: (status, retry_after) для следующих отправок.
+        self.responses = []
+
+    def send_batch(self, messages):
+        from habits.telegram import SendResult
+
+        results = []
+        for chat_id, text in messages:
+            if self.fail_after is not None and len(self.sent) >= self.fail_after:
+                raise RuntimeError("worker died")
+            if self.responses:
+                status, retry_after = self.responses.pop(0)
+                results.append(SendResult(chat_id, ok=False, status=status, error="err", retry_after=retry_after))
+                continue
+            self.sent.append((chat_id, text))
+            results.append(SendResult(chat_id, ok=True, status=200))
+        return results
+
+    @property
+    def texts(self):
+        return [text for _, text in self.sent]
+
+
+@pytest.fixture
+def tg_sender(monkeypatch):
+    sender = FakeSender()
+    monkeypatch.setattr("habits.telegram._sender", sender)
+    return sender
@@ -0,0 +1,51 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from habits.models import Habit
+
+
+@pytest.mark.django_db
+def test_bulk_import_is_a_handful_of_queries(api_client, user):
+    payload = {"create": [{"time": "08:00", "action": f"a{i}", "periodicity_days": 1 + i % 7} for i in range(500)]}
+
+    with CaptureQueriesContext(connection) as queries:
+        r = api_client.post("/api/habits/bulk/", payload, format="json")
+    assert r.status_code == 200, r.data
+    assert len(queries) < 10
+    assert len(r.data["create"]) == 500 and all(item["status"] == 201 for item in r.data["create"])
+    habit = Habit.objects.get(id=r.data["create"][0]["data"]["id"])
+    assert habit.user == user and habit.next_due_at is not None
+
+
+@pytest.mark.django_db
+def test_bulk_update_and_delete_apply_together_or_not_at_all(api_client, user, another_user):
+    keep, drop = (Habit.objects.create(user=user, time="08:00", action=a, periodicity_days=1) for a in ("run", "swim"))
+    foreign = Habit.objects.create(user=another_user, time="08:00", action="x", periodicity_days=1)
+
+    r = api_client.post(
+        "/api/habits/bulk/",
+        {
+            "create": [{"time": "09:00", "action": "read", "periodicity_days": 9}],
+            "update": [{"id": keep.id, "time": "10:00"}],
+            "delete": [drop.id, foreign.id],
+        },
+        format="json",
+    )
+    assert r.status_code == 400
+    assert r.data["create"][0]["status"] == 400 and r.data["update"] == [None]
+    assert r.data["delete"] == [None, {"id": foreign.id, "status": 404}]
+    assert Habit.objects.filter(user=user).count() == 2
+
+    old_minute = keep.fire_minute
+    r = api_client.post(
+        "/api/habits/bulk/",
+        {"update": [{"id": keep.id, "time": "10:00"}], "delete": [drop.id]},
+        format="json",
+    )
+    assert r.status_code == 200, r.data
+    keep.refresh_from_db()
+    assert r.data["update"][0]["data"]["time"] == "10:00:00"
+    assert keep.fire_minute != old_minute
+    assert not Habit.objects.filter(id=drop.id).exists()
+    assert Habit.objects.filter(id=foreign.id).exists()
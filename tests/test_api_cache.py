@@ -0,0 +1,60 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from habits.models import Habit
+
+
+@pytest.fixture(autouse=True)
+def shared_cache(settings):
+    # в тестах LocMemCache общий: бот, задачи и API работают в одном процессе
+    settings.HABITS_API_CACHE = True
+
+
+def _habit_queries(queries):
+    return [q["sql"] for q in queries if "habits_habit" in q["sql"]]
+
+
+@pytest.mark.django_db
+def test_unchanged_poll_is_304_without_touching_habits(api_client, user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        habit = Habit.objects.create(user=user, time="08:00", action="run", periodicity_days=1)
+
+    r = api_client.get("/api/habits/")
+    tag = r["ETag"]
+    assert r.status_code == 200 and r.data["results"][0]["action"] == "run"
+
+    with CaptureQueriesContext(connection) as queries:
+        assert api_client.get("/api/habits/", HTTP_IF_NONE_MATCH=tag).status_code == 304
+        assert api_client.get(f"/api/habits/{habit.id}/", HTTP_IF_NONE_MATCH=tag).status_code == 304
+        # другой клиент без ETag получает страницу из кэша
+        assert api_client.get("/api/habits/").data["results"][0]["action"] == "run"
+    assert _habit_queries(queries) == []
+
+    # запись (здесь — отметка из бота) меняет версию
+    with django_capture_on_commit_callbacks(execute=True):
+        Habit.objects.filter(id=habit.id).check_in(user)
+    r = api_client.get("/api/habits/", HTTP_IF_NONE_MATCH=tag)
+    assert r.status_code == 200 and r["ETag"] != tag
+    assert r.data["results"][0]["last_performed_at"] is not None
+
+
+@pytest.mark.django_db
+def test_versions_are_per_user(api_client, user, another_user, django_capture_on_commit_callbacks):
+    tag = api_client.get("/api/habits/")["ETag"]
+    with django_capture_on_commit_callbacks(execute=True):
+        Habit.objects.create(user=another_user, time="08:00", action="x", periodicity_days=1)
+    assert api_client.get("/api/habits/", HTTP_IF_NONE_MATCH=tag).status_code == 304
+
+    with django_capture_on_commit_callbacks(execute=True):
+        r = api_client.post("/api/habits/", {"time": "07:00", "action": "run", "periodicity_days": 1}, format="json")
+    assert r.status_code == 201
+    assert api_client.get("/api/habits/", HTTP_IF_NONE_MATCH=tag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_no_etag_without_shared_cache(api_client, user, settings):
+    settings.HABITS_API_CACHE = False
+    r = api_client.get("/api/habits/")
+    assert r.status_code == 200 and "ETag" not in r
+    assert api_client.get("/api/habits/", HTTP_IF_NONE_MATCH="*").status_code == 200
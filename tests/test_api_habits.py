@@ -47,3 +47,21 @@ def test_pagination_exact_size(api_client):
     assert r2.status_code == 200
     assert len(r1.data["results"]) == 5
     assert len(r2.data["results"]) == 2
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_all_habits_without_count(api_client, user, another_user):
+    ids = [Habit.objects.create(user=user, time="08:00", action=f"a{i}", periodicity_days=1).id for i in range(7)]
+    Habit.objects.create(user=another_user, time="08:00", action="foreign", periodicity_days=1)
+
+    seen, url = [], "/api/habits/?cursor=&page_size=3"
+    while url:
+        r = api_client.get(url)
+        assert r.status_code == 200
+        assert "count" not in r.data
+        seen += [item["id"] for item in r.data["results"]]
+        url = r.data["next"]
+    assert seen == ids
+
+    r = api_client.get("/api/habits/?cursor=&page_size=1000")
+    assert len(r.data["results"]) == 7
@@ -0,0 +1,148 @@
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from habits.models import Habit
+from tgbot.users import user_cache
+
+os.environ.setdefault("BOT_TOKEN", "123:test")
+import telegram_bot  # noqa: E402
+
+
+@pytest.fixture
+def chat_user(user):
+    # бот находит пользователя по username == chat_id
+    user.username = str(user.telegram_chat_id)
+    user.save()
+    user_cache.clear()
+    return user
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    calls = []
+    for name in ("send_message", "edit_message_text", "answer_callback_query"):
+        monkeypatch.setattr(
+            telegram_bot.bot, name, lambda *args, _name=name, **kwargs: calls.append((_name, args, kwargs))
+        )
+    return calls
+
+
+def _callback(user, data):
+    message = SimpleNamespace(chat=SimpleNamespace(id=user.telegram_chat_id), message_id=10)
+    return SimpleNamespace(id="cb", data=data, message=message)
+
+
+@pytest.mark.django_db
+def test_page_is_one_message_built_with_one_query(chat_user):
+    for i in range(telegram_bot.HABITS_PAGE_SIZE + 2):
+        Habit.objects.create(user=chat_user, time=f"08:{i:02d}", action=f"h{i}", periodicity_days=1)
+
+    with CaptureQueriesContext(connection) as queries:
+        text, kb = telegram_bot.render_habits_page(chat_user, 0)
+    assert len(queries) == 1
+    assert text.count("🎯") == telegram_bot.HABITS_PAGE_SIZE
+    assert kb.keyboard[-1][0].callback_data == "page:1"
+
+    text, kb = telegram_bot.render_habits_page(chat_user, 1)
+    assert text.count("🎯") == 2 and "9. 🎯" in text
+    assert [b.callback_data for b in kb.keyboard[-1]] == ["page:0"]
+
+
+@pytest.mark.django_db
+def test_done_and_delete_edit_the_list_in_place(chat_user, api_calls):
+    done, gone = (
+        Habit.objects.create(user=chat_user, time="08:00", action=a, periodicity_days=1) for a in ("run", "swim")
+    )
+    telegram_bot.send_habits_info(chat_user.telegram_chat_id)
+
+    telegram_bot.handle_done_callback(_callback(chat_user, f"done:{done.id}:0"))
+    telegram_bot.handle_delete_callback(_callback(chat_user, f"del:{gone.id}:0"))
+
+    assert [name for name, _, _ in api_calls] == [
+        "send_message",
+        "answer_callback_query",
+        "edit_message_text",
+        "answer_callback_query",
+        "edit_message_text",
+    ]
+    done.refresh_from_db()
+    assert done.last_performed_at is not None
+    final_text = api_calls[-1][1][0]
+    assert "run" in final_text and "swim" not in final_text
+
+
+@pytest.mark.django_db
+def test_check_in_is_a_single_conditional_update(chat_user, api_calls):
+    habit = Habit.objects.create(user=chat_user, time="08:00", action="run", periodicity_days=2)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert Habit.objects.filter(id=habit.id).check_in(chat_user) == 1
+    assert len(queries) == 1
+    # повторная отметка в тот же локальный день ничего не меняет
+    assert Habit.objects.filter(id=habit.id).check_in(chat_user) == 0
+
+    habit.refresh_from_db()
+    marks = (habit.next_due_at, habit.overdue_at)
+    habit.save(update_fields=["fire_minute", "next_due_at", "overdue_at"])
+    habit.refresh_from_db()
+    assert (habit.next_due_at, habit.overdue_at) == marks
+
+    telegram_bot.handle_done_callback(_callback(chat_user, f"done:{habit.id}:0"))
+    assert api_calls[0][2] == {"show_alert": True, "text": telegram_bot.t(chat_user, "cannot_mark_twice")}
+
+
+@pytest.mark.django_db
+def test_mark_all_checks_in_only_pending_habits(chat_user, another_user, api_calls):
+    pending = [
+        Habit.objects.create(user=chat_user, time=f"08:0{i}", action=f"h{i}", periodicity_days=1) for i in range(3)
+    ]
+    Habit.objects.filter(id=pending[0].id).check_in(chat_user)
+    done_at = Habit.objects.get(id=pending[0].id).last_performed_at
+    foreign = Habit.objects.create(user=another_user, time="08:00", action="x", periodicity_days=1)
+
+    text, kb = telegram_bot.render_habits_page(chat_user, 0)
+    assert kb.keyboard[-1][0].callback_data == "doneall:0"
+    telegram_bot.handle_done_all_callback(_callback(chat_user, "doneall:0"))
+
+    assert api_calls[0][2]["text"] == telegram_bot.t(chat_user, "done_all_marked").format(n=2)
+    assert Habit.objects.get(id=pending[0].id).last_performed_at == done_at
+    assert Habit.objects.filter(user=chat_user, last_performed_at__isnull=True).count() == 0
+    assert Habit.objects.get(id=foreign.id).last_performed_at is None
+    # всё выполнено — кнопки «отметить все» больше нет
+    assert "doneall:0" not in str(api_calls[-1][2]["reply_markup"].to_dict())
+
+
+@pytest.mark.django_db
+def test_mark_all_skips_habits_that_are_not_due_yet(chat_user, api_calls):
+    due = Habit.objects.create(user=chat_user, time="08:00", action="run", periodicity_days=1)
+    weekly = Habit.objects.create(
+        user=chat_user, time="09:00", action="swim", periodicity_days=7,
+        last_performed_at=timezone.now() - timedelta(days=1),
+    )
+    weekly_marks = (weekly.last_performed_at, weekly.next_due_at, weekly.overdue_at)
+
+    telegram_bot.handle_done_all_callback(_callback(chat_user, "doneall:0"))
+
+    assert api_calls[0][2]["text"] == telegram_bot.t(chat_user, "done_all_marked").format(n=1)
+    due.refresh_from_db()
+    weekly.refresh_from_db()
+    assert due.last_performed_at is not None
+    assert (weekly.last_performed_at, weekly.next_due_at, weekly.overdue_at) == weekly_marks
+
+
+@pytest.mark.django_db
+def test_page_past_the_end_falls_back_to_last_page(chat_user):
+    for i in range(telegram_bot.HABITS_PAGE_SIZE + 1):
+        Habit.objects.create(user=chat_user, time=f"08:{i:02d}", action=f"h{i}", periodicity_days=1)
+
+    with CaptureQueriesContext(connection) as queries:
+        text, kb = telegram_bot.render_habits_page(chat_user, 10_000)
+    assert len(queries) == 3
+    assert text.count("🎯") == 1 and f"{telegram_bot.HABITS_PAGE_SIZE + 1}. 🎯" in text
+    assert kb.keyboard[-1][0].callback_data == "page:0"
@@ -0,0 +1,89 @@
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from habits.models import Habit
+from tgbot import metrics
+from tgbot.sender import limited_request_sender
+
+
+@pytest.fixture(autouse=True)
+def clean_registry():
+    metrics.registry.reset()
+    yield
+    metrics.registry.reset()
+
+
+@pytest.mark.django_db
+def test_handler_queries_and_api_calls_are_recorded(user, monkeypatch):
+    class Session:
+        def request(self, method, url, **kwargs):
+            return None
+
+    monkeypatch.setattr("tgbot.sender.apihelper._get_req_session", lambda: Session())
+
+    @metrics.instrument("inner")
+    def inner():
+        return Habit.objects.filter(user=user).count()
+
+    @metrics.instrument("outer")
+    def outer():
+        list(Habit.objects.all())
+        inner()
+        limited_request_sender("post", "https://api.telegram.org/botX/sendMessage", params={"chat_id": 1})
+
+    outer()
+
+    outer_h = metrics.registry.handlers["outer"]
+    inner_h = metrics.registry.handlers["inner"]
+    assert outer_h["db_queries"].sum == 2 and inner_h["db_queries"].sum == 1
+    assert outer_h["api_calls"].sum == 1 and inner_h["api_calls"].sum == 0
+    assert outer_h["duration_ms"].count == 1
+    assert any(line.startswith("outer: n=1") for line in metrics.registry.summary())
+
+
+def test_errors_are_counted_and_reraised():
+    @metrics.instrument("boom")
+    def boom():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        boom()
+    assert metrics.registry.errors["boom"] == 1
+
+
+def test_metrics_endpoint_requires_token(client, settings):
+    metrics.registry.record("h", 12.0, metrics._Span(), failed=False)
+    assert client.get("/telegram/metrics/").status_code == 404
+
+    settings.BOT_METRICS_TOKEN = "t"
+    assert client.get("/telegram/metrics/").status_code == 403
+    resp = client.get("/telegram/metrics/", HTTP_AUTHORIZATION="Bearer t")
+    assert resp.status_code == 200
+    assert 'tgbot_handler_duration_ms_bucket{handler="h",le="25"} 1' in resp.content.decode()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_bot_process_serves_its_own_metrics():
+    assert metrics.start_http_server(_free_port(), "") is None
+    metrics.registry.record("h", 12.0, metrics._Span(), failed=False)
+    server = metrics.start_http_server(_free_port(), "t", host="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_port}/metrics"
+    try:
+        with pytest.raises(urllib.error.HTTPError) as denied:
+            urllib.request.urlopen(url, timeout=5)
+        assert denied.value.code == 403
+        request = urllib.request.Request(url, headers={"Authorization": "Bearer t"})
+        with urllib.request.urlopen(request, timeout=5) as resp:
+            body = resp.read().decode()
+        assert 'tgbot_handler_duration_ms_bucket{handler="h",le="25"} 1' in body
+    finally:
+        server.shutdown()
+        server.server_close()
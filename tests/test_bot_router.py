@@ -0,0 +1,49 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from habits.models import Habit
+from tgbot.router import Router
+from tgbot.users import user_cache
+
+os.environ.setdefault("BOT_TOKEN", "123:test")
+import telegram_bot  # noqa: E402
+
+
+def test_router_indexes_every_language_and_rejects_ambiguous_texts():
+    router = Router({"go": {"en": "Go", "ru": "Вперёд"}, "stop": {"en": "Stop", "ru": "Go"}})
+    handler = router.action("go")(lambda *args: "go")
+
+    assert router.resolve(" Вперёд ") is handler
+    assert router.resolve("Вперёд", step="time") is None
+    with pytest.raises(ValueError):
+        router.index("stop")
+
+
+@pytest.fixture
+def chat_user(user):
+    user.username = str(user.telegram_chat_id)
+    user.language = "en"
+    user.save()
+    user_cache.clear()
+    return user
+
+
+@pytest.mark.django_db
+def test_add_habit_flow_is_routed_by_step(chat_user, monkeypatch):
+    replies = []
+    monkeypatch.setattr(telegram_bot.bot, "reply_to", lambda message, text, **kwargs: replies.append(text))
+
+    def say(text):
+        telegram_bot.handle_menu_and_flow(SimpleNamespace(chat=SimpleNamespace(id=chat_user.telegram_chat_id), text=text))
+
+    # кнопка меню на другом языке тоже распознаётся
+    for text in ("Añadir hábito", "run", "07:30", "2"):
+        say(text)
+    habit = Habit.objects.get(user=chat_user)
+    assert (habit.action, habit.periodicity_days) == ("run", 2)
+
+    say(f"/done_{habit.id}")
+    say(f"/done_{habit.id}")
+    assert replies[-2:] == [telegram_bot.t(chat_user, "done_marked"), telegram_bot.t(chat_user, "cannot_mark_twice")]
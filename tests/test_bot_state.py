@@ -0,0 +1,56 @@
+import pytest
+
+from tgbot.state import MemoryStateStore, RedisStateStore, StateStore
+
+
+def test_memory_state_expires_and_returns_copies(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr("tgbot.state.time.monotonic", lambda: clock[0])
+    store = MemoryStateStore(ttl=60, sweep_every=3)
+    store.set(1, {"step": "action", "data": {}})
+
+    state = store.get(1)
+    state["step"] = "time"
+    assert store.get(1)["step"] == "action"
+
+    clock[0] = 61
+    assert store.get(1) is None
+    store.set(2, {"step": "a"})
+    clock[0] = 200
+    store.set(3, {"step": "b"})
+    assert len(store) == 1
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data, self.ttl = {}, {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key], self.ttl[key] = value.encode(), ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def test_redis_state_uses_per_key_expiry():
+    store = RedisStateStore("redis://localhost:6379/0", ttl=900)
+    store.client = FakeRedis()
+
+    store.set(42, {"step": "periodicity", "data": {"action": "run", "time": "08:00"}})
+    assert store.client.ttl["tgbot:state:42"] == 900
+    assert store.get(42)["data"]["time"] == "08:00"
+
+    store.delete(42)
+    assert store.get(42) is None
+
+
+def test_state_store_requires_every_method():
+    class Partial(StateStore):
+        def get(self, chat_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
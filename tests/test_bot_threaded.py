@@ -0,0 +1,114 @@
+import asyncio
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from tgbot.dispatch import SeenUpdates
+from tgbot.threaded import ThreadedRuntime
+
+
+def make_updates(chats, per_chat, seed, start=1):
+    """Апдейты вперемешку между чатами, внутри чата — по возрастанию seq."""
+    rnd = random.Random(seed)
+    order = [chat for chat in range(chats) for _ in range(per_chat)]
+    rnd.shuffle(order)
+    seq = [0] * chats
+    updates = []
+    for update_id, chat in enumerate(order, start=start):
+        message = SimpleNamespace(chat=SimpleNamespace(id=chat), seq=seq[chat])
+        seq[chat] += 1
+        updates.append(SimpleNamespace(update_id=update_id, message=message))
+    return updates
+
+
+class Recorder:
+    def __init__(self, latency):
+        self.latency = latency
+        self.seen = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, update):
+        time.sleep(self.latency)
+        with self._lock:
+            self.seen.setdefault(update.message.chat.id, []).append(update.message.seq)
+
+    def ordered(self):
+        return all(seqs == sorted(seqs) for seqs in self.seen.values())
+
+
+def _run(runtime, updates):
+    async def main():
+        await runtime.accept(updates)
+        await runtime.drain()
+
+    asyncio.run(main())
+    runtime.close()
+
+
+def test_runtime_is_concurrent_and_keeps_chat_order():
+    updates = make_updates(chats=40, per_chat=3, seed=1)
+    handler = Recorder(latency=0.02)
+
+    started = time.perf_counter()
+    _run(ThreadedRuntime(handler, workers=40, max_pending=50), updates)
+
+    # последовательно было бы 120 * 20 мс = 2.4 с
+    assert time.perf_counter() - started < 1.0
+    assert sum(len(seqs) for seqs in handler.seen.values()) == len(updates)
+    assert handler.ordered()
+
+
+def test_failing_handler_does_not_stop_the_lane():
+    updates = make_updates(chats=1, per_chat=3, seed=1)
+    handled = []
+    lock = threading.Lock()
+
+    def handle(update):
+        if update.message.seq == 0:
+            raise RuntimeError("boom")
+        with lock:
+            handled.append(update.message.seq)
+
+    _run(ThreadedRuntime(handle, workers=2, max_pending=1), updates)
+    assert handled == [1, 2]
+
+
+def test_offset_is_acknowledged_only_after_processing():
+    slow, fast = make_updates(chats=2, per_chat=1, seed=1, start=10)
+    release = threading.Event()
+    done = SeenUpdates()
+
+    def handle(update):
+        if update is slow:
+            release.wait(5)
+
+    runtime = ThreadedRuntime(handle, workers=2, done=done)
+    offsets = []
+
+    async def main():
+        assert await runtime.accept([slow, fast])
+        while not done.seen(fast.update_id):
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        # fast обработан, но slow ещё нет — подтверждать можно только до slow
+        offsets.append(runtime.ack_offset())
+        # Telegram вернёт те же апдейты: в работу они повторно не идут
+        assert not await runtime.accept([slow, fast])
+        release.set()
+        await runtime.drain()
+        offsets.append(runtime.ack_offset())
+
+    asyncio.run(main())
+    runtime.close()
+    assert offsets == [slow.update_id, fast.update_id + 1]
+
+
+def test_updates_processed_before_restart_are_skipped():
+    updates = make_updates(chats=1, per_chat=2, seed=1)
+    done = SeenUpdates()
+    done.mark(updates[1].update_id)
+    handled = []
+
+    _run(ThreadedRuntime(handled.append, workers=1, done=done), updates)
+    assert handled == [updates[0]]
@@ -0,0 +1,108 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tgbot.users import UserCache, get_user_by_chat, user_cache
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    user_cache.clear()
+    yield
+    user_cache.clear()
+
+
+def test_lru_evicts_oldest_and_ttl_expires(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr("tgbot.users.time.monotonic", lambda: clock[0])
+    cache = UserCache(maxsize=2, ttl=10)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    cache.get(1)
+    cache.set(3, "c")
+    assert cache.get(2) is None and cache.get(1) == "a"
+
+    clock[0] += 11
+    assert cache.get(1) is None and len(cache) == 1
+
+
+@pytest.mark.django_db
+def test_hot_path_resolves_user_without_queries():
+    user = get_user_by_chat(555)
+    with CaptureQueriesContext(connection) as queries:
+        assert get_user_by_chat(555) is user
+    assert len(queries) == 0
+
+
+@pytest.mark.django_db
+def test_user_edits_invalidate_cache():
+    user = get_user_by_chat(555)
+    user.language = "es"
+    user.save(update_fields=["language"])
+
+    fresh = get_user_by_chat(555)
+    assert fresh is not user and fresh.language == "es"
+
+    fresh.delete()
+    assert user_cache.get(555) is None
+
+
+@pytest.mark.django_db
+def test_check_in_uses_current_timezone_of_cached_user():
+    from datetime import datetime, timedelta
+    from datetime import timezone as dt_timezone
+    from zoneinfo import ZoneInfo
+
+    from django.contrib.auth import get_user_model
+
+    from habits.models import Habit
+
+    user = get_user_by_chat(555)
+    habit = Habit.objects.create(user=user, time="08:00", action="run", periodicity_days=1)
+    # правка из другого процесса: сигналы этого процесса о ней не знают
+    get_user_model().objects.filter(pk=user.pk).update(timezone="Asia/Tokyo")
+    cached = get_user_by_chat(555)
+    assert cached.timezone != "Asia/Tokyo"
+
+    now = datetime(2026, 1, 15, 20, 0, tzinfo=dt_timezone.utc)  # в Токио уже 16 января
+    assert Habit.objects.filter(id=habit.id).check_in(cached, now=now) == 1
+
+    habit.refresh_from_db()
+    tokyo_midnight = datetime(2026, 1, 17, tzinfo=ZoneInfo("Asia/Tokyo"))
+    assert habit.next_due_at == tokyo_midnight
+    assert habit.overdue_at == tokyo_midnight + timedelta(days=1)
+
+
+@pytest.mark.django_db
+def test_user_events_from_other_processes_invalidate_cache(settings, monkeypatch):
+    import json
+    import threading
+
+    from tgbot import users
+
+    user = get_user_by_chat(555)
+    cached, delivered = threading.Event(), threading.Event()
+
+    class PubSub:
+        def subscribe(self, channel):
+            pass
+
+        def listen(self):
+            cached.wait(5)
+            yield {"type": "message", "data": json.dumps({"user": user.pk})}
+            delivered.set()
+            threading.Event().wait()
+
+    class Client:
+        def pubsub(self, **kwargs):
+            return PubSub()
+
+    settings.HABITS_EVENTS_URL = "redis://events"
+    monkeypatch.setattr(users, "_listener", None)
+    monkeypatch.setattr(users.events, "get_client", lambda: Client())
+    users.start_invalidation_listener()
+    user_cache.set(555, user)  # заполняем уже после подписки
+    cached.set()
+
+    assert delivered.wait(5)
+    assert user_cache.get(555) is None
@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+
+import pytest
+
+from habits.models import Habit
+from tgbot import webhook
+from tgbot.dispatch import ChatLocks, SeenUpdates
+from tgbot.users import user_cache
+
+URL = "/telegram/webhook/"
+
+
+def _message_update(update_id, chat_id, text):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+            "text": text,
+        },
+    }
+
+
+def test_chat_locks_serialize_one_chat():
+    locks = ChatLocks(wait=0.05)
+    with locks.hold(1) as first:
+        with locks.hold(1) as again:
+            assert first and not again
+    with locks.hold(1) as after:
+        assert after
+
+
+class RecordingBot:
+    def __init__(self):
+        self.items = []
+        self.fail = False
+
+    def process_new_updates(self, updates):
+        if self.fail:
+            raise RuntimeError("handler failed")
+        self.items.extend((update.message.chat.id, update.message.text) for update in updates)
+
+
+@pytest.fixture
+def bot(settings, monkeypatch):
+    settings.TELEGRAM_WEBHOOK_SECRET = "s3cret"
+    recording = RecordingBot()
+    monkeypatch.setattr(webhook, "_bot", recording)
+    monkeypatch.setattr(webhook, "_chat_locks", ChatLocks(wait=0.05))
+    monkeypatch.setattr(webhook, "_seen_updates", SeenUpdates())
+    return recording
+
+
+def _post(client, body, secret="s3cret"):
+    return client.post(URL, body, content_type="application/json", HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret)
+
+
+def test_webhook_checks_secret_and_processes_before_answering(client, bot):
+    body = json.dumps(_message_update(1, 777, "/start"))
+
+    assert client.post(URL, body, content_type="application/json").status_code == 403
+    assert _post(client, body, secret="wrong").status_code == 403
+
+    assert _post(client, body).status_code == 200
+    assert bot.items == [(777, "/start")]
+
+    # ошибка хендлера — в лог, ответ 200: повтор апдейта небезопасен
+    bot.fail = True
+    assert _post(client, json.dumps(_message_update(2, 777, "/start"))).status_code == 200
+
+    # чат занят другим воркером — 503, апдейт не отмечен и придёт снова
+    bot.fail = False
+    with webhook.get_chat_locks().hold(777):
+        assert _post(client, json.dumps(_message_update(3, 777, "/start"))).status_code == 503
+    assert _post(client, json.dumps(_message_update(3, 777, "/start"))).status_code == 200
+    assert bot.items == [(777, "/start"), (777, "/start")]
+
+
+def test_seen_updates_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("tgbot.dispatch.time.monotonic", lambda: now[0])
+    seen = SeenUpdates(ttl=10)
+    assert seen.first_time(1) and not seen.first_time(1)
+    now[0] += 10
+    assert seen.first_time(1)
+
+
+@pytest.mark.django_db
+def test_redelivered_update_does_not_create_habit_twice(client, settings, monkeypatch, user):
+    os.environ.setdefault("BOT_TOKEN", "123:test")
+    import telegram_bot
+
+    settings.TELEGRAM_WEBHOOK_SECRET = "s3cret"
+    monkeypatch.setattr(webhook, "_chat_locks", ChatLocks(wait=0.05))
+    monkeypatch.setattr(webhook, "_seen_updates", SeenUpdates())
+    monkeypatch.setattr(telegram_bot.bot, "threaded", False)
+    monkeypatch.setattr(webhook, "_bot", telegram_bot.bot)
+    user.username = str(user.telegram_chat_id)
+    user.save()
+    user_cache.clear()
+
+    def reply_times_out(*args, **kwargs):
+        raise TimeoutError("Bot API timed out")
+
+    monkeypatch.setattr(telegram_bot.bot, "reply_to", reply_times_out)
+    chat_id = user.telegram_chat_id
+    telegram_bot.STATE.set(chat_id, {"step": "periodicity", "data": {"action": "run", "time": "07:30"}})
+    body = json.dumps(_message_update(10, chat_id, "2"))
+
+    assert _post(client, body).status_code == 200
+    # ответа не было — Telegram доставляет апдейт ещё раз
+    assert _post(client, body).status_code == 200
+
+    assert Habit.objects.filter(user=user).count() == 1
+    telegram_bot.STATE.delete(chat_id)
+
+
+def test_webhook_without_bot_token_is_503(client, settings, monkeypatch):
+    settings.TELEGRAM_WEBHOOK_SECRET = "s3cret"
+    monkeypatch.setattr(webhook, "_bot", None)
+    monkeypatch.delitem(sys.modules, "telegram_bot", raising=False)
+    monkeypatch.delenv("BOT_TOKEN", raising=False)
+
+    assert _post(client, json.dumps(_message_update(1, 777, "/start"))).status_code == 503
+
+
+def test_webhook_disabled_without_secret(client, settings):
+    settings.TELEGRAM_WEBHOOK_SECRET = ""
+    assert client.post(URL, "{}", content_type="application/json").status_code == 404
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from habits import tasks
+from habits.locks import LockLost, MemoryLockBackend, get_lock_backend, next_fence
+from habits.models import Habit, ScanCheckpoint
+
+
+def test_memory_lease_is_exclusive_and_expires():
+    backend = MemoryLockBackend()
+    assert backend.acquire("scan", 1, ttl=0.05)
+    assert not backend.acquire("scan", 2, ttl=0.05)
+
+    time.sleep(0.06)
+    assert backend.acquire("scan", 3, ttl=10)
+    assert not backend.release("scan", 1)
+    assert backend.release("scan", 3)
+
+
+@pytest.mark.django_db
+def test_fences_are_durable_across_restarts(user, tg_sender, monkeypatch):
+    ScanCheckpoint.objects.create(name="notify_overdue", run_key="w", fence=1)
+    assert next_fence("notify_overdue") == 1
+    # «перезапуск»: новый бэкенд аренд, а счётчик токенов — в БД
+    monkeypatch.setattr("habits.locks._backend", MemoryLockBackend())
+    assert next_fence("notify_overdue") == 2
+
+    Habit.objects.create(user=user, time="08:00", action="a", periodicity_days=1)
+    assert tasks.notify_overdue(run_key="w") == {"queued": 1}
+    assert ScanCheckpoint.objects.get(run_key="w").fence == 3
+
+
+def test_memory_backend_is_refused_outside_debug(settings, monkeypatch):
+    settings.HABITS_LOCK_URL = None
+    settings.DEBUG = False
+    monkeypatch.setattr("habits.locks._backend", None)
+    with pytest.raises(ImproperlyConfigured):
+        get_lock_backend()
+
+
+@pytest.mark.django_db
+def test_overlapping_beat_runs_are_skipped(user, tg_sender, task_locks):
+    Habit.objects.create(user=user, time="08:00", action="a", periodicity_days=1)
+    task_locks.acquire("notify_overdue", 1, ttl=60)
+
+    assert tasks.notify_overdue(run_key="x") == {"skipped": True}
+    assert not ScanCheckpoint.objects.exists()
+
+
+@pytest.mark.django_db
+def test_stale_fence_cannot_overwrite_progress(user, tg_sender):
+    Habit.objects.create(user=user, time="08:00", action="a", periodicity_days=1)
+    checkpoint = ScanCheckpoint.objects.create(name="notify_overdue", run_key="y", fence=5)
+
+    with pytest.raises(LockLost):
+        tasks.notify_overdue(run_key="y")
+    checkpoint.refresh_from_db()
+    assert checkpoint.last_id == 0 and checkpoint.completed_at is None
+
+
+@pytest.mark.django_db
+def test_sharded_run_keeps_lease_until_chord_callback(user, tg_sender, task_locks, settings, monkeypatch):
+    settings.HABITS_SCAN_SHARDS = 2
+    for i in range(4):
+        Habit.objects.create(user=user, time="08:00", action=f"a{i}", periodicity_days=1)
+    held = []
+    scan = tasks._scan_overdue
+
+    def spy(*args, **kwargs):
+        held.append(not task_locks.acquire("notify_overdue", 0, ttl=60))
+        return scan(*args, **kwargs)
+
+    monkeypatch.setattr(tasks, "_scan_overdue", spy)
+    assert tasks.notify_overdue(run_key="z") == {"shards": 2}
+    assert held == [True, True]
+    # колбэк chord снял аренду
+    assert task_locks.acquire("notify_overdue", 0, ttl=60)
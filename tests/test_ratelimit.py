@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+from habits.ratelimit import BULK, INTERACTIVE, MemoryBuckets, RateLimiter
+from habits.telegram import TelegramSender
+from tgbot import sender
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("habits.ratelimit.time.monotonic", lambda: now[0])
+    return now
+
+
+def test_per_chat_and_global_buckets(clock):
+    limiter = RateLimiter(MemoryBuckets(), global_rate=10, global_burst=10, chat_rate=1, chat_burst=2,
+                          interactive_reserve=0)
+    assert limiter.wait_time(1) == 0 and limiter.wait_time(1) == 0
+    assert limiter.wait_time(1) == pytest.approx(1.0)
+    clock[0] += 1
+    assert limiter.wait_time(1) == 0
+
+    for chat in range(2, 11):
+        assert limiter.wait_time(chat) == 0
+    assert limiter.wait_time(100) == pytest.approx(0.1)
+
+
+def test_refilled_chat_buckets_are_evicted(clock):
+    buckets = MemoryBuckets()
+    limiter = RateLimiter(buckets, global_rate=1000, global_burst=1000, chat_rate=1, chat_burst=3,
+                          interactive_reserve=0)
+    for chat in range(100):
+        assert limiter.wait_time(chat) == 0
+    assert len(buckets._buckets) == 101
+
+    clock[0] += MemoryBuckets.SWEEP_INTERVAL
+    assert limiter.wait_time(1000) == 0
+    assert set(buckets._buckets) == {"global", "chat:1000"}
+
+
+def test_bulk_leaves_reserve_for_interactive(clock):
+    limiter = RateLimiter(MemoryBuckets(), global_rate=5, global_burst=5, chat_rate=10, chat_burst=10,
+                          interactive_reserve=2)
+    sent = 0
+    while limiter.wait_time(sent, BULK) == 0:
+        sent += 1
+    assert sent == 3
+    assert limiter.wait_time(99, INTERACTIVE) == 0
+    assert limiter.wait_time(98, INTERACTIVE) == 0
+    assert limiter.wait_time(97, INTERACTIVE) > 0
+
+
+def test_sender_reports_local_throttling_as_retryable(rate_limiter, settings, monkeypatch):
+    settings.TELEGRAM_BULK_MAX_WAIT = 0
+    monkeypatch.setattr(rate_limiter, "wait_time", lambda chat_id, priority: 2.5)
+
+    result = TelegramSender("123:abc", concurrency=1).send(1, "hi")
+    assert result.status == 429 and result.retryable and result.retry_after == 2.5
+
+
+def test_bot_requests_take_interactive_tokens(rate_limiter, monkeypatch):
+    taken = []
+    monkeypatch.setattr(rate_limiter, "acquire", lambda chat_id, priority, timeout: taken.append((chat_id, priority)))
+
+    class Session:
+        def request(self, method, url, **kwargs):
+            resp = requests.Response()
+            resp.status_code = 200
+            return resp
+
+    monkeypatch.setattr(sender.apihelper, "_get_req_session", lambda: Session())
+    sender.limited_request_sender("post", "https://api.telegram.org/botX/sendMessage", params={"chat_id": 7})
+    sender.limited_request_sender("post", "https://api.telegram.org/botX/getUpdates", params={})
+    assert taken == [(7, INTERACTIVE)]
@@ -0,0 +1,185 @@
+import pytest
+
+from habits import tasks
+from habits.models import Habit, Notification, ScanCheckpoint
+
+
+@pytest.fixture
+def overdue_habits(user):
+    return [
+        Habit.objects.create(user=user, time="08:00", action=f"a{i}", periodicity_days=1)
+        for i in range(5)
+    ]
+
+
+@pytest.mark.django_db
+def test_notify_overdue_resumes_from_checkpoint(overdue_habits, tg_sender, monkeypatch):
+    enqueue = tasks.enqueue_notifications
+    calls = []
+
+    def flaky_enqueue(habit_ids, kind, slot):
+        calls.append(habit_ids)
+        if len(calls) == 2:
+            raise RuntimeError("worker died")
+        return enqueue(habit_ids, kind, slot)
+
+    monkeypatch.setattr(tasks, "enqueue_notifications", flaky_enqueue)
+    with pytest.raises(RuntimeError):
+        tasks.notify_overdue(run_key="r1", batch_size=2)
+
+    checkpoint = ScanCheckpoint.objects.get(name="notify_overdue", run_key="r1")
+    assert checkpoint.last_id == overdue_habits[1].id
+    assert checkpoint.completed_at is None
+    assert tg_sender.sent == []
+
+    monkeypatch.setattr(tasks, "enqueue_notifications", enqueue)
+    tasks.notify_overdue(run_key="r1", batch_size=2)
+    assert len(tg_sender.sent) == 1
+    assert all(f"/done_{h.id}" in tg_sender.texts[0] for h in overdue_habits)
+
+    tg_sender.sent.clear()
+    tasks.notify_overdue(run_key="r1", batch_size=2)
+    assert tg_sender.sent == []
+
+
+@pytest.mark.django_db
+def test_sharded_overdue_scan_aggregates_counts(overdue_habits, another_user, tg_sender, settings, monkeypatch):
+    Habit.objects.create(user=another_user, time="08:00", action="b", periodicity_days=1)
+    another_user.telegram_chat_id = None
+    another_user.save()
+    settings.HABITS_SCAN_SHARDS = 3
+    collected = []
+    monkeypatch.setattr(tasks.logger, "info", lambda msg, *args: collected.append(args))
+
+    assert tasks.notify_overdue(run_key="r2") == {"shards": 3}
+
+    assert collected == [("notify_overdue", {"queued": 5}, 3)]
+    shards = ScanCheckpoint.objects.filter(run_key__startswith="r2/")
+    assert shards.count() == 3
+    assert all(c.completed_at for c in shards)
+    assert Notification.objects.filter(status=Notification.Status.SENT).count() == 5
+
+
+@pytest.mark.django_db
+def test_missing_bot_token_leaves_outbox_untouched(overdue_habits, tg_sender):
+    tg_sender.token = ""
+    tasks.notify_overdue(run_key="no-token")
+
+    assert tg_sender.sent == []
+    assert set(Notification.objects.values_list("status", "attempts")) == {(Notification.Status.PENDING, 0)}
+
+
+@pytest.mark.django_db
+def test_chord_callback_merges_every_shard_count(tg_sender):
+    results = [{"queued": 2, "deduplicated": 1}, {"queued": 1, "stale": 3}, {}]
+
+    assert tasks.collect_scan_counts(results, "notify_overdue") == {"queued": 3, "deduplicated": 1, "stale": 3}
+
+
+@pytest.mark.django_db
+def test_purge_removes_old_completed_checkpoints(overdue_habits, tg_sender, settings):
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    settings.HABITS_CHECKPOINT_RETENTION_DAYS = 7
+    tasks.notify_overdue(run_key="old")
+    tasks.notify_overdue(run_key="fresh")
+    old = timezone.now() - timedelta(days=8)
+    ScanCheckpoint.objects.filter(run_key="old").update(completed_at=old)
+    ScanCheckpoint.objects.create(name="notify_overdue", run_key="stuck")
+    ScanCheckpoint.objects.create(**tasks.WATERMARK, watermark=old)
+
+    assert tasks.purge_notifications()["checkpoints"] == 1
+    assert set(ScanCheckpoint.objects.values_list("run_key", flat=True)) == {"fresh", "stuck", "watermark"}
+
+
+@pytest.mark.django_db
+def test_outbox_deduplicates_overlapping_scans(overdue_habits, tg_sender):
+    tasks.notify_overdue(run_key="a")
+    tasks.notify_overdue(run_key="b")
+
+    assert len(tg_sender.sent) == 1
+    assert Notification.objects.filter(status=Notification.Status.SENT).count() == 5
+
+
+@pytest.mark.django_db
+def test_digest_per_user_and_kind(user, another_user, tg_sender):
+    user.language = "es"
+    user.save()
+    mine = [
+        Habit.objects.create(user=user, time="08:00", action=f"m{i}", periodicity_days=1)
+        for i in range(3)
+    ]
+    theirs = Habit.objects.create(user=another_user, time="08:00", action="t", periodicity_days=1)
+
+    tasks.notify_overdue(run_key="d")
+
+    by_chat = dict(tg_sender.sent)
+    assert len(tg_sender.sent) == 2
+    assert by_chat[user.telegram_chat_id].startswith("⚠️ Hábitos atrasados:")
+    assert all(f"/done_{h.id}" in by_chat[user.telegram_chat_id] for h in mine)
+    assert by_chat[another_user.telegram_chat_id] == f"⚠️ Habit overdue (> 1 days): {theirs.action}"
+
+
+@pytest.mark.django_db
+def test_digests_fit_telegram_text_limit(user, tg_sender, monkeypatch):
+    for i in range(tasks.DIGEST_MAX_ITEMS):
+        Habit.objects.create(user=user, time="08:00", action=f"{i:03d}" + "x" * 252, periodicity_days=1)
+
+    tasks.notify_overdue(run_key="long")
+    # длинные action обрезаются — 30 строк помещаются в одно сообщение
+    assert len(tg_sender.texts) == 1 and len(tg_sender.texts[0]) <= tasks.TELEGRAM_MAX_TEXT
+    assert "x" * 252 not in tg_sender.texts[0] and "…" in tg_sender.texts[0]
+
+    monkeypatch.setattr(tasks, "ACTION_MAX_CHARS", 255)
+    Notification.objects.all().delete()
+    tg_sender.sent.clear()
+    tasks.notify_overdue(run_key="long-full")
+    assert len(tg_sender.texts) > 1
+    assert all(len(text) <= tasks.TELEGRAM_MAX_TEXT for text in tg_sender.texts)
+    assert Notification.objects.filter(status=Notification.Status.SENT).count() == tasks.DIGEST_MAX_ITEMS
+
+
+@pytest.mark.django_db
+def test_delivery_honors_retry_after_then_dead_letters(user, tg_sender, settings, monkeypatch):
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    settings.NOTIFICATION_MAX_ATTEMPTS = 2
+    Habit.objects.create(user=user, time="08:00", action="x", periodicity_days=1)
+    tg_sender.responses = [(429, 7.0)]
+
+    tasks.notify_overdue(run_key="retry")
+    n = Notification.objects.get()
+    assert n.status == Notification.Status.PENDING
+    assert n.attempts == 1
+    assert timedelta(seconds=7) <= n.next_attempt_at - timezone.now() <= timedelta(seconds=9)
+
+    later = timezone.now() + timedelta(seconds=10)
+    monkeypatch.setattr(tasks.timezone, "now", lambda: later)
+    tg_sender.responses = [(502, None)]
+    tasks.deliver_notifications()
+    n.refresh_from_db()
+    assert n.status == Notification.Status.DEAD
+    assert n.attempts == 2
+    assert tg_sender.sent == []
+
+
+@pytest.mark.django_db
+def test_permanent_error_goes_straight_to_dead_letter(user, tg_sender):
+    Habit.objects.create(user=user, time="08:00", action="x", periodicity_days=1)
+    tg_sender.responses = [(403, None)]
+
+    tasks.notify_overdue(run_key="blocked")
+
+    assert Notification.objects.get().status == Notification.Status.DEAD
+
+
+@pytest.mark.django_db
+def test_rescan_of_same_slot_reports_only_new_rows(overdue_habits, tg_sender):
+    assert tasks.notify_overdue(run_key="first") == {"queued": 5}
+    # новый запуск в тот же день — тот же слот, всё уже в outbox
+    assert tasks.notify_overdue(run_key="second") == {"queued": 0}
+    assert Notification.objects.count() == 5
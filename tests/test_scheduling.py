@@ -0,0 +1,142 @@
+from datetime import datetime, time
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from habits import tasks
+from habits.models import Habit, Notification, ScanCheckpoint
+from habits.scheduling import fire_minute
+
+
+def test_fire_minute_follows_dst():
+    madrid = ZoneInfo("Europe/Madrid")
+    winter = datetime(2026, 1, 15, 12, tzinfo=dt_timezone.utc)
+    summer = datetime(2026, 7, 15, 12, tzinfo=dt_timezone.utc)
+    assert fire_minute(time(8, 0), madrid, winter) == 7 * 60
+    assert fire_minute(time(8, 0), madrid, summer) == 6 * 60
+    assert fire_minute(time(0, 30), ZoneInfo("Asia/Tokyo"), winter) == 15 * 60 + 30
+
+
+def test_fire_minute_uses_offset_of_next_occurrence():
+    madrid = ZoneInfo("Europe/Madrid")
+    # 2026-03-29 в 01:00 UTC Мадрид переходит с UTC+1 на UTC+2
+    before = datetime(2026, 3, 28, 10, tzinfo=dt_timezone.utc)
+    assert fire_minute(time(8, 0), madrid, before) == 6 * 60  # завтра, уже UTC+2
+    assert fire_minute(time(12, 0), madrid, before) == 11 * 60  # сегодня, ещё UTC+1
+
+
+@pytest.mark.django_db
+def test_resync_fire_minutes_before_dst_transition(user, monkeypatch):
+    user.timezone = "Europe/Madrid"
+    user.save()
+    winter = datetime(2026, 1, 15, 12, tzinfo=dt_timezone.utc)
+    monkeypatch.setattr(tasks.timezone, "now", lambda: winter)
+    early = Habit.objects.create(user=user, time="08:00", action="run", periodicity_days=1)
+    recent = Habit.objects.create(user=user, time="10:30", action="read", periodicity_days=1)
+    late = Habit.objects.create(user=user, time="12:00", action="swim", periodicity_days=1)
+    assert [h.fire_minute for h in (early, recent, late)] == [7 * 60, 9 * 60 + 30, 11 * 60]
+
+    before = datetime(2026, 3, 28, 10, tzinfo=dt_timezone.utc)
+    monkeypatch.setattr(tasks.timezone, "now", lambda: before)
+    assert tasks.resync_fire_minutes() == 1
+
+    for h in (early, recent, late):
+        h.refresh_from_db()
+    # 10:30 по Мадриду (09:30 UTC) ещё в окне догона — минута сегодняшнего срабатывания
+    assert [h.fire_minute for h in (early, recent, late)] == [6 * 60, 9 * 60 + 30, 11 * 60]
+
+
+@pytest.mark.django_db
+def test_fire_minute_synced_on_time_and_timezone_change(user):
+    user.timezone = "UTC"
+    user.save()
+    h = Habit.objects.create(user=user, time="09:15", action="read", periodicity_days=1)
+    assert h.fire_minute == 9 * 60 + 15
+
+    h.time = time(10, 0)
+    h.save(update_fields=["time"])
+    h.refresh_from_db()
+    assert h.fire_minute == 10 * 60
+
+    user.timezone = "Asia/Tokyo"
+    user.save(update_fields=["timezone"])
+    h.refresh_from_db()
+    assert h.fire_minute == 1 * 60
+
+
+@pytest.mark.django_db
+def test_send_due_habits_uses_user_timezone(user, another_user, tg_sender, monkeypatch):
+    user.timezone = "America/New_York"
+    user.save()
+    another_user.timezone = "Europe/Madrid"
+    another_user.save()
+    now = datetime(2026, 1, 15, 13, 0, 20, tzinfo=dt_timezone.utc)
+    monkeypatch.setattr(tasks.timezone, "now", lambda: now)
+    ny = Habit.objects.create(user=user, time="08:00", action="run", periodicity_days=1)
+    Habit.objects.create(user=another_user, time="08:00", action="swim", periodicity_days=1)
+
+    tasks.send_due_habits()
+
+    assert len(tg_sender.sent) == 1
+    assert tg_sender.sent[0][0] == user.telegram_chat_id
+    assert f"/done_{ny.id}" in tg_sender.sent[0][1]
+
+
+@pytest.mark.django_db
+def test_schedule_marks_drive_due_and_overdue_scans(user, tg_sender, monkeypatch):
+    user.timezone = "UTC"
+    user.save()
+    now = datetime(2026, 3, 10, 9, 0, 5, tzinfo=dt_timezone.utc)
+    monkeypatch.setattr(tasks.timezone, "now", lambda: now)
+    fresh = Habit.objects.create(
+        user=user, time="09:00", action="fresh", periodicity_days=2,
+        last_performed_at=datetime(2026, 3, 9, 7, 0, tzinfo=dt_timezone.utc),
+    )
+    Habit.objects.create(
+        user=user, time="09:00", action="due", periodicity_days=2,
+        last_performed_at=datetime(2026, 3, 8, 7, 0, tzinfo=dt_timezone.utc),
+    )
+    late = Habit.objects.create(
+        user=user, time="09:00", action="late", periodicity_days=1,
+        last_performed_at=datetime(2026, 3, 8, 7, 0, tzinfo=dt_timezone.utc),
+    )
+    assert fresh.next_due_at == datetime(2026, 3, 11, tzinfo=dt_timezone.utc)
+    assert fresh.overdue_at == datetime(2026, 3, 12, tzinfo=dt_timezone.utc)
+
+    tasks.send_due_habits()
+    assert len(tg_sender.texts) == 1
+    assert "due" in tg_sender.texts[0] and "late" in tg_sender.texts[0]
+    assert "fresh" not in tg_sender.texts[0]
+
+    tg_sender.sent.clear()
+    tasks.notify_overdue()
+    assert len(tg_sender.texts) == 1 and "late" in tg_sender.texts[0]
+
+    late.last_performed_at = now
+    late.save(update_fields=["last_performed_at"])
+    late.refresh_from_db()
+    assert late.overdue_at == datetime(2026, 3, 12, tzinfo=dt_timezone.utc)
+
+
+@pytest.mark.django_db
+def test_send_due_habits_catches_up_missed_minutes(user, tg_sender, settings, monkeypatch):
+    user.timezone = "UTC"
+    user.save()
+    settings.HABITS_MAX_CATCHUP_MINUTES = 30
+    clock = [datetime(2026, 3, 10, 8, 58, 10, tzinfo=dt_timezone.utc)]
+    monkeypatch.setattr(tasks.timezone, "now", lambda: clock[0])
+    missed = Habit.objects.create(user=user, time="09:00", action="missed", periodicity_days=1)
+    Habit.objects.create(user=user, time="07:00", action="too-old", periodicity_days=1)
+    tasks.send_due_habits()
+    assert tg_sender.sent == []
+
+    # beat молчал 5 минут: 09:00 обрабатывается запуском в 09:03
+    clock[0] = datetime(2026, 3, 10, 9, 3, 40, tzinfo=dt_timezone.utc)
+    assert tasks.send_due_habits() == {"queued": 1}
+    n = Notification.objects.get()
+    assert n.habit == missed and n.slot == datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+
+    assert tasks.send_due_habits() == {"queued": 0}
+    checkpoint = ScanCheckpoint.objects.get(name="send_due_habits")
+    assert checkpoint.watermark == datetime(2026, 3, 10, 9, 3, tzinfo=dt_timezone.utc)
@@ -1,87 +1,64 @@
-from django.utils import timezone
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
 
+import pytest
 
+from habits import tasks
 from habits.models import Habit
 
+NOW = datetime(2026, 3, 10, 9, 0, 5, tzinfo=dt_timezone.utc)
 
-# Тесты патчат эту функцию. Оставляем как простую заглушку.
-def _send_tg(chat_id: int | str, text: str) -> None:
-    """
-    Send a Telegram message to given chat_id.
-    In production, implement real sending. In tests, this is monkeypatched.
-    """
-    # Реальная отправка может быть здесь, например, через requests к Telegram Bot API.
-    # В тестах эта функция подменяется.
-    pass
-
-
-def _days_since(last_dt, now_dt) -> int:
-    # сравниваем по локальным датам
-    return (now_dt.date() - last_dt.date()).days
-
-
-def send_due_habits() -> None:
-    """
-    Отправляет напоминание о привычках, которые «на сегодня»
-    (время совпадает по минутам) и по периодичности должны выполняться сегодня.
-    """
-    now = timezone.localtime()  # в тесте monkeypatch подменяет это на фиксированное время
-    hh, mm = now.hour, now.minute
-
-    qs = Habit.objects.select_related("user").all()
-    for h in qs:
-        # время по расписанию совпало?
-        if (h.time.hour, h.time.minute) != (hh, mm):
-            continue
-
-        # нужно ли выполнять сегодня (>= periodicity_days или ни разу не выполнялась)
-        due_today = False
-        if h.last_performed_at is None:
-            due_today = True
-        else:
-            last_local = timezone.localtime(h.last_performed_at)
-            days = _days_since(last_local, now)
-            if days >= h.periodicity_days:
-                due_today = True
-
-        if not due_today:
-            continue
-
-        chat_id = getattr(h.user, "telegram_chat_id", None)
-        if chat_id:
-            _send_tg(
-                chat_id,
-                f"⏰ Habit reminder: {h.action} @ {h.time.strftime('%H:%M')}",
-            )
-
-
-def notify_overdue() -> None:
-    """
-    Уведомляет о просроченных привычках.
-    Просрочено, если:
-      - last_performed_at is None
-      - или прошло > periodicity_days дней.
-    """
-    now = timezone.localtime()
-
-    qs = Habit.objects.select_related("user").all()
-    for h in qs:
-        overdue = False
-        if h.last_performed_at is None:
-            overdue = True
-        else:
-            last_local = timezone.localtime(h.last_performed_at)
-            days = _days_since(last_local, now)
-            # строго больше периодичности — просрочено
-            if days > h.periodicity_days:
-                overdue = True
-
-        if not overdue:
-            continue
-
-        chat_id = getattr(h.user, "telegram_chat_id", None)
-        if chat_id:
-            _send_tg(
-                chat_id,
-                f"⚠️ Habit overdue (> {h.periodicity_days} days): {h.action}",
-            )
+
+@pytest.fixture
+def utc_user(user, monkeypatch):
+    user.timezone = "UTC"
+    user.save()
+    monkeypatch.setattr(tasks.timezone, "now", lambda: NOW)
+    return user
+
+
+def _habit(user, action, periodicity_days=1, days_ago=None, time="09:00"):
+    last = None if days_ago is None else NOW - timedelta(days=days_ago)
+    return Habit.objects.create(
+        user=user, time=time, action=action, periodicity_days=periodicity_days, last_performed_at=last
+    )
+
+
+@pytest.mark.django_db
+def test_send_due_habits_matches_minute_and_periodicity(utc_user, tg_sender):
+    _habit(utc_user, "never")
+    _habit(utc_user, "due", periodicity_days=2, days_ago=2)
+    _habit(utc_user, "not-yet", periodicity_days=3, days_ago=2)
+    _habit(utc_user, "other-minute", time="09:01")
+
+    tasks.send_due_habits()
+
+    assert len(tg_sender.texts) == 1
+    text = tg_sender.texts[0]
+    assert "never" in text and "due" in text
+    assert "not-yet" not in text and "other-minute" not in text
+
+
+@pytest.mark.django_db
+def test_notify_overdue_is_strictly_after_periodicity(utc_user, tg_sender):
+    _habit(utc_user, "never")
+    _habit(utc_user, "late", periodicity_days=2, days_ago=3)
+    _habit(utc_user, "on-time", periodicity_days=2, days_ago=2)
+
+    tasks.notify_overdue()
+
+    assert len(tg_sender.texts) == 1
+    text = tg_sender.texts[0]
+    assert "never" in text and "late" in text
+    assert "on-time" not in text
+
+
+@pytest.mark.django_db
+def test_users_without_chat_are_skipped(utc_user, tg_sender):
+    utc_user.telegram_chat_id = None
+    utc_user.save()
+    _habit(utc_user, "never")
+
+    assert tasks.send_due_habits() == {"queued": 0}
+    assert tasks.notify_overdue() == {"queued": 0}
+    assert tg_sender.sent == []
@@ -0,0 +1,43 @@
+import requests
+from requests.adapters import BaseAdapter
+
+from habits.telegram import TelegramSender
+
+
+class StubAdapter(BaseAdapter):
+    """Отвечает 200 всем чатам, кроме 403 для chat_id=0."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        resp = requests.Response()
+        resp.status_code = 403 if b'"chat_id": 0' in request.body else 200
+        resp._content = b"{}"
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+def test_send_batch_returns_results_in_order():
+    sender = TelegramSender("123:abc", concurrency=4)
+    adapter = StubAdapter()
+    sender.session.mount("https://", adapter)
+
+    results = sender.send_batch([(1, "a"), (0, "b"), (3, "c")])
+    sender.close()
+
+    assert [r.chat_id for r in results] == [1, 0, 3]
+    assert [r.ok for r in results] == [True, False, True]
+    assert results[1].status == 403
+    assert adapter.calls == 3
+
+
+def test_send_without_token_fails_fast():
+    result = TelegramSender("", concurrency=1).send(1, "hi")
+    assert not result.ok and result.error
+    assert not result.retryable
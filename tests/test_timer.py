@@ -0,0 +1,90 @@
+import json
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from habits import events
+from habits.models import Habit, Notification
+from habits.scheduling import next_fire_at
+from habits.timer import ReminderScheduler, TimerHeap
+
+NOW = datetime(2026, 3, 10, 8, 30, tzinfo=dt_timezone.utc)
+
+
+def test_timer_heap_reschedule_and_cancel():
+    heap = TimerHeap()
+    heap.schedule("a", NOW + timedelta(minutes=5))
+    heap.schedule("b", NOW + timedelta(minutes=1))
+    heap.schedule("a", NOW)
+    heap.cancel("b")
+
+    assert heap.next_at() == NOW
+    assert heap.pop_due(NOW + timedelta(minutes=10)) == [("a", NOW)]
+    assert len(heap) == 0 and heap.next_at() is None
+
+
+def test_next_fire_at_is_exact_across_dst():
+    madrid = ZoneInfo("Europe/Madrid")
+    # 29.03.2026 — переход на летнее время: 08:00 — это уже 06:00 UTC.
+    before = datetime(2026, 3, 28, 7, 30, tzinfo=dt_timezone.utc)
+    assert next_fire_at(time(8, 0), madrid, before) == datetime(2026, 3, 29, 6, 0, tzinfo=dt_timezone.utc)
+
+
+@pytest.mark.django_db
+def test_scheduler_fires_and_follows_updates(user, tg_sender, monkeypatch):
+    user.timezone = "UTC"
+    user.save()
+    clock = [NOW]
+    monkeypatch.setattr("django.utils.timezone.now", lambda: clock[0])
+    habit = Habit.objects.create(user=user, time="09:00", action="run", periodicity_days=1)
+    later = Habit.objects.create(user=user, time="10:00", action="read", periodicity_days=1)
+
+    scheduler = ReminderScheduler()
+    scheduler.load(NOW)
+    assert scheduler.timers.next_at() == datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)
+    assert scheduler.seconds_until_next(NOW) == 30 * 60
+
+    later.time = time(9, 0)
+    later.save()
+    scheduler.apply({"habit": later.id}, NOW)
+    clock[0] = datetime(2026, 3, 10, 9, 0, 1, tzinfo=dt_timezone.utc)
+    assert scheduler.fire() == 2
+    assert len(tg_sender.texts) == 1 and "run" in tg_sender.texts[0] and "read" in tg_sender.texts[0]
+    assert set(Notification.objects.values_list("slot", flat=True)) == {datetime(2026, 3, 10, 9, 0, tzinfo=dt_timezone.utc)}
+
+    # выполнено — следующее срабатывание только через периодичность
+    habit.last_performed_at = NOW
+    habit.save()
+    scheduler.apply({"habit": habit.id}, NOW)
+    assert scheduler.timers._entries[habit.id] == datetime(2026, 3, 11, 9, 0, tzinfo=dt_timezone.utc)
+
+    scheduler.apply({"habit": later.id, "deleted": True}, NOW)
+    assert later.id not in scheduler.timers
+
+
+@pytest.mark.django_db
+def test_model_changes_publish_schedule_events(user, settings, monkeypatch, django_capture_on_commit_callbacks):
+    published = []
+
+    class FakeRedis:
+        def publish(self, channel, payload):
+            published.append((channel, json.loads(payload)))
+
+    settings.HABITS_EVENTS_URL = "redis://test"
+    monkeypatch.setattr(events, "_client", FakeRedis())
+
+    with django_capture_on_commit_callbacks(execute=True):
+        habit = Habit.objects.create(user=user, time="09:00", action="run", periodicity_days=1)
+        user.timezone = "Asia/Tokyo"
+        user.save(update_fields=["timezone"])
+        habit_id = habit.id
+        habit.delete()
+
+    assert {channel for channel, _ in published} == {events.CHANNEL}
+    assert [event for _, event in published] == [
+        {"habit": habit_id},
+        {"user": user.id},
+        {"habit": habit_id, "deleted": True},
+    ]
@@ -0,0 +1,127 @@
+"""
+Порядок обработки апдейтов одного чата.
+
+Апдейты одного чата нельзя обрабатывать одновременно: шаги диалога (tgbot.state)
+перезапишут друг друга. ChatLocks — взаимоисключение по chat_id: в Redis
+(BOT_STATE_URL) — общее для всех воркеров и реплик web, без Redis — внутри
+процесса, на фиксированном наборе блокировок (память не растёт с числом чатов).
+
+Хендлеры не идемпотентны (шаг «периодичность» создаёт привычку до ответа),
+поэтому повторно доставленный апдейт обрабатывать нельзя. SeenUpdates
+запоминает update_id: в Redis (SET NX EX) — для всех воркеров и перезапусков,
+без Redis — в памяти процесса. Вебхук отмечает апдейт перед обработкой,
+рантайм с опросом (tgbot.threaded) — после.
+"""
+
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def update_chat_id(update):
+    """chat_id апдейта (для порядка в полосе); апдейты без чата идут по update_id."""
+    for kind in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        message = getattr(update, kind, None)
+        if message is not None:
+            return message.chat.id
+    callback = getattr(update, "callback_query", None)
+    if callback is not None and callback.message is not None:
+        return callback.message.chat.id
+    return f"update:{update.update_id}"
+
+
+class ChatLocks:
+    STRIPES = 256
+
+    def __init__(self, url=None, ttl=60, wait=30, prefix="tg:chat-lock:"):
+        self.ttl = ttl
+        self.wait = wait
+        self.prefix = prefix
+        self.client = None
+        if url:
+            import redis
+
+            self.client = redis.Redis.from_url(url)
+        self._stripes = [threading.Lock() for _ in range(self.STRIPES)]
+
+    @contextmanager
+    def hold(self, chat_id):
+        """Держит блокировку чата; отдаёт False, если не дождались за wait секунд."""
+        if self.client is not None:
+            lock = self.client.lock(f"{self.prefix}{chat_id}", timeout=self.ttl, blocking_timeout=self.wait)
+            acquired = lock.acquire()
+        else:
+            lock = self._stripes[zlib.crc32(str(chat_id).encode()) % self.STRIPES]
+            acquired = lock.acquire(timeout=self.wait)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception:
+                    # Redis-блокировка истекла по ttl — её уже мог взять другой воркер
+                    logger.warning("chat lock %s expired before release", chat_id)
+
+
+class SeenUpdates:
+    def __init__(self, url=None, ttl=24 * 60 * 60, prefix="tg:update:"):
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = None
+        if url:
+            import redis
+
+            self.client = redis.Redis.from_url(url)
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, update_id) -> bool:
+        """Отмечает апдейт; False — он уже приходил (за последние ttl секунд)."""
+        if self.client is not None:
+            try:
+                return bool(self.client.set(f"{self.prefix}{update_id}", 1, nx=True, ex=int(self.ttl)))
+            except Exception:
+                # без Redis лучше обработать апдейт, чем потерять его
+                logger.warning("update %s: dedup store unavailable", update_id, exc_info=True)
+                return True
+        with self._lock:
+            if self._memory_seen(update_id):
+                return False
+            self._seen[update_id] = time.monotonic() + self.ttl
+            return True
+
+    def seen(self, update_id) -> bool:
+        """Отмечен ли апдейт (без отметки)."""
+        if self.client is not None:
+            try:
+                return bool(self.client.exists(f"{self.prefix}{update_id}"))
+            except Exception:
+                logger.warning("update %s: dedup store unavailable", update_id, exc_info=True)
+                return False
+        with self._lock:
+            return self._memory_seen(update_id)
+
+    def mark(self, update_id):
+        """Отмечает апдейт как обработанный."""
+        if self.client is not None:
+            try:
+                self.client.set(f"{self.prefix}{update_id}", 1, ex=int(self.ttl))
+            except Exception:
+                logger.warning("update %s: dedup store unavailable", update_id, exc_info=True)
+            return
+        with self._lock:
+            if not self._memory_seen(update_id):
+                self._seen[update_id] = time.monotonic() + self.ttl
+
+    def _memory_seen(self, update_id):
+        now = time.monotonic()
+        # ttl у всех записей один, поэтому старейшие — в начале
+        while self._seen and next(iter(self._seen.values())) <= now:
+            self._seen.popitem(last=False)
+        return update_id in self._seen
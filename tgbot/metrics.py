@@ -0,0 +1,246 @@
+"""
+Метрики хендлеров бота: время выполнения, SQL-запросы и вызовы Telegram API.
+
+Хендлер оборачивается декоратором @instrument(); на время вызова открывается
+«спан», в который execute_wrapper соединения Django пишет запросы, а
+tgbot.sender — исходящие вызовы API. Вложенные инструментированные вызовы
+(send_habits_info внутри handle_menu_and_flow) учитываются и в своём спане,
+и во внешнем.
+
+Данные — гистограммы с фиксированными корзинами на имя хендлера, своя копия
+в каждом процессе. Их видно в периодической сводке в логе
+(BOT_METRICS_LOG_INTERVAL) и в формате Prometheus (при заданном BOT_METRICS_TOKEN):
+  - процесс бота (polling и threaded) отдаёт их сам на BOT_METRICS_PORT
+    (start_http_server);
+  - в режиме вебхука хендлеры работают в web, и метрики отдаёт
+    /telegram/metrics/ — но только того воркера, который принял запрос,
+    поэтому полную картину он даёт лишь при одном воркере web.
+"""
+
+import bisect
+import contextvars
+import functools
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# Верхние границы корзин, мс.
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class _Span:
+    __slots__ = ("queries", "db_ms", "api_calls", "api_ms")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.api_calls = 0
+        self.api_ms = 0.0
+
+
+_spans = contextvars.ContextVar("tgbot_metrics_spans", default=())
+
+
+class Registry:
+    METRICS = {
+        "duration_ms": BUCKETS_MS,
+        "db_ms": BUCKETS_MS,
+        "db_queries": COUNT_BUCKETS,
+        "api_ms": BUCKETS_MS,
+        "api_calls": COUNT_BUCKETS,
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.handlers = defaultdict(lambda: {name: Histogram(b) for name, b in self.METRICS.items()})
+        self.errors = defaultdict(int)
+
+    def record(self, name, duration_ms, span, failed):
+        with self._lock:
+            h = self.handlers[name]
+            h["duration_ms"].observe(duration_ms)
+            h["db_ms"].observe(span.db_ms)
+            h["db_queries"].observe(span.queries)
+            h["api_ms"].observe(span.api_ms)
+            h["api_calls"].observe(span.api_calls)
+            if failed:
+                self.errors[name] += 1
+
+    def summary(self):
+        """Строки сводки: вызовы, p50/p95 времени, средние запросы и вызовы API."""
+        lines = []
+        with self._lock:
+            for name, h in sorted(self.handlers.items(), key=lambda kv: -kv[1]["duration_ms"].sum):
+                n = h["duration_ms"].count
+                lines.append(
+                    f"{name}: n={n} p50={h['duration_ms'].quantile(0.5)}ms p95={h['duration_ms'].quantile(0.95)}ms "
+                    f"db={h['db_queries'].sum / n:.1f}q/{h['db_ms'].sum / n:.1f}ms "
+                    f"api={h['api_calls'].sum / n:.1f}/{h['api_ms'].sum / n:.1f}ms errors={self.errors[name]}"
+                )
+        return lines
+
+    def render_prometheus(self):
+        out = []
+        with self._lock:
+            for metric in self.METRICS:
+                full = f"tgbot_handler_{metric}"
+                out.append(f"# TYPE {full} histogram")
+                for name, h in self.handlers.items():
+                    hist = h[metric]
+                    cumulative = 0
+                    for bound, n in zip(hist.bounds, hist.counts):
+                        cumulative += n
+                        out.append(f'{full}_bucket{{handler="{name}",le="{bound}"}} {cumulative}')
+                    out.append(f'{full}_bucket{{handler="{name}",le="+Inf"}} {hist.count}')
+                    out.append(f'{full}_sum{{handler="{name}"}} {hist.sum}')
+                    out.append(f'{full}_count{{handler="{name}"}} {hist.count}')
+            out.append("# TYPE tgbot_handler_errors_total counter")
+            for name, n in self.errors.items():
+                out.append(f'tgbot_handler_errors_total{{handler="{name}"}} {n}')
+        return "\n".join(out) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.handlers.clear()
+            self.errors.clear()
+
+
+registry = Registry()
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        for span in _spans.get():
+            span.queries += 1
+            span.db_ms += elapsed
+
+
+def record_api_call(elapsed_ms):
+    """Вызывается tgbot.sender для каждого исходящего запроса к Telegram API."""
+    for span in _spans.get():
+        span.api_calls += 1
+        span.api_ms += elapsed_ms
+
+
+def instrument(name=None):
+    def decorator(func):
+        metric_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            span = _Span()
+            outer = _spans.get()
+            token = _spans.set(outer + (span,))
+            started = time.perf_counter()
+            failed = False
+            try:
+                if outer:
+                    return func(*args, **kwargs)
+                # execute_wrapper ставим один раз на внешний спан: соединение своё у каждого потока.
+                with connection.execute_wrapper(_db_wrapper):
+                    return func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _spans.reset(token)
+                registry.record(metric_name, (time.perf_counter() - started) * 1000, span, failed)
+
+        return wrapper
+
+    return decorator
+
+
+_summary_thread = None
+
+
+def start_log_summary(interval):
+    """Фоновая сводка метрик в лог раз в interval секунд (0 — выключено)."""
+    global _summary_thread
+    if not interval or _summary_thread is not None:
+        return
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            for line in registry.summary():
+                logger.info("handler %s", line)
+
+    _summary_thread = threading.Thread(target=loop, name="tgbot-metrics", daemon=True)
+    _summary_thread.start()
+
+
+def authorized(header, token):
+    return hmac.compare_digest(header or "", f"Bearer {token}")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    token = ""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        if not authorized(self.headers.get("Authorization"), self.token):
+            self.send_error(403)
+            return
+        body = registry.render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics %s", format % args)
+
+
+def start_http_server(port, token, host="0.0.0.0"):
+    """
+    GET /metrics с метриками этого процесса бота (Bearer token) в фоновом
+    потоке. Без порта или токена не запускается. Возвращает сервер или None.
+    """
+    if not port or not token:
+        return None
+    handler = type("MetricsHandler", (_MetricsHandler,), {"token": token})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="tgbot-metrics-http", daemon=True).start()
+    logger.info("bot metrics on http://%s:%s/metrics", host, server.server_port)
+    return server
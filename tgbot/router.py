@@ -0,0 +1,54 @@
+"""
+Маршрутизация текстовых сообщений бота без перебора условий.
+
+Router строится один раз при импорте telegram_bot: обратный индекс
+«локализованный текст кнопки → ключ TR» по всем языкам и таблица
+«шаг диалога → хендлер». На сообщение — один поиск в словаре вместо
+цепочки сравнений с заново переведёнными строками.
+"""
+
+
+class Router:
+    def __init__(self, translations):
+        self.translations = translations
+        self._keys = {}
+        self._actions = {}
+        self._steps = {}
+
+    def index(self, *keys):
+        """Добавляет тексты ключей TR на всех языках в обратный индекс."""
+        for key in keys:
+            for text in self.translations[key].values():
+                text = text.strip()
+                other = self._keys.setdefault(text, key)
+                if other != key:
+                    raise ValueError(f"{text!r} is both {other!r} and {key!r}")
+
+    def action(self, key):
+        """Регистрирует хендлер нажатия кнопки меню key (на любом языке)."""
+
+        def decorator(func):
+            self.index(key)
+            self._actions[key] = func
+            return func
+
+        return decorator
+
+    def step(self, *steps):
+        """Регистрирует хендлер ответа на шаге диалога."""
+
+        def decorator(func):
+            for step in steps:
+                self._steps[step] = func
+            return func
+
+        return decorator
+
+    def key_for(self, text):
+        return self._keys.get((text or "").strip())
+
+    def resolve(self, text, step=None):
+        """Хендлер для сообщения: по шагу диалога, если он есть, иначе по тексту кнопки."""
+        if step:
+            return self._steps.get(step)
+        return self._actions.get(self.key_for(text))
@@ -0,0 +1,43 @@
+"""
+Исходящие запросы бота через общий лимит Telegram (habits.ratelimit).
+
+Подключается как telebot.apihelper.CUSTOM_REQUEST_SENDER: методы, которые
+пишут в чат, сначала берут токен с приоритетом INTERACTIVE. Если токен
+не дождались за TELEGRAM_INTERACTIVE_MAX_WAIT, запрос всё равно уходит —
+ответ пользователю важнее риска получить 429.
+Время каждого вызова попадает в метрики хендлеров (tgbot.metrics).
+"""
+
+import time
+
+from django.conf import settings
+from telebot import apihelper
+
+from habits.ratelimit import INTERACTIVE, get_limiter
+
+from .metrics import record_api_call
+
+RATE_LIMITED_METHODS = {
+    "sendMessage",
+    "editMessageText",
+    "editMessageReplyMarkup",
+    "sendPhoto",
+    "sendDocument",
+    "forwardMessage",
+    "copyMessage",
+}
+
+
+def limited_request_sender(method, url, **kwargs):
+    if url.rsplit("/", 1)[-1] in RATE_LIMITED_METHODS:
+        chat_id = (kwargs.get("params") or {}).get("chat_id")
+        get_limiter().acquire(chat_id, INTERACTIVE, timeout=settings.TELEGRAM_INTERACTIVE_MAX_WAIT)
+    started = time.perf_counter()
+    try:
+        return apihelper._get_req_session().request(method, url, **kwargs)
+    finally:
+        record_api_call((time.perf_counter() - started) * 1000)
+
+
+def install_rate_limiter():
+    apihelper.CUSTOM_REQUEST_SENDER = limited_request_sender
@@ -0,0 +1,95 @@
+"""
+Хранилище состояния диалогов бота (шаги добавления привычки, выбор языка).
+
+Состояние — небольшой JSON-совместимый dict на chat_id с TTL: брошенные
+диалоги истекают сами. С Redis (BOT_STATE_URL, по умолчанию REDIS_URL)
+состояние видят все реплики бота; без него — словарь в памяти процесса.
+Хранилище возвращает копию: после изменения состояние нужно записать обратно.
+"""
+
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+
+
+class StateStore(ABC):
+    """Интерфейс хранилища состояния диалогов."""
+
+    @abstractmethod
+    def get(self, chat_id) -> dict | None:
+        """Копия состояния чата или None."""
+
+    @abstractmethod
+    def set(self, chat_id, state: dict) -> None:
+        """Записывает состояние чата (TTL отсчитывается заново)."""
+
+    @abstractmethod
+    def delete(self, chat_id) -> None:
+        """Сбрасывает состояние чата."""
+
+
+class MemoryStateStore(StateStore):
+    """Словарь в памяти с истечением записей; просроченные чистятся при записи."""
+
+    def __init__(self, ttl=3600.0, sweep_every=1000):
+        self.ttl = ttl
+        self.sweep_every = sweep_every
+        self._data = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, chat_id):
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._data[chat_id]
+                return None
+            return json.loads(entry[1])
+
+    def set(self, chat_id, state):
+        with self._lock:
+            now = time.monotonic()
+            self._data[chat_id] = (now + self.ttl, json.dumps(state))
+            self._writes += 1
+            if self._writes % self.sweep_every == 0:
+                for key in [k for k, (expires, _) in self._data.items() if expires <= now]:
+                    del self._data[key]
+
+    def delete(self, chat_id):
+        with self._lock:
+            self._data.pop(chat_id, None)
+
+
+class RedisStateStore(StateStore):
+    """Состояние в Redis: JSON под ключом на chat_id, истечение — через SET EX."""
+
+    def __init__(self, url, ttl=3600, prefix="tgbot:state:"):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    def get(self, chat_id):
+        raw = self.client.get(f"{self.prefix}{chat_id}")
+        return json.loads(raw) if raw else None
+
+    def set(self, chat_id, state):
+        self.client.set(f"{self.prefix}{chat_id}", json.dumps(state), ex=self.ttl)
+
+    def delete(self, chat_id):
+        self.client.delete(f"{self.prefix}{chat_id}")
+
+
+def get_state_store() -> StateStore:
+    if settings.BOT_STATE_URL:
+        return RedisStateStore(settings.BOT_STATE_URL, ttl=settings.BOT_STATE_TTL)
+    return MemoryStateStore(ttl=settings.BOT_STATE_TTL)
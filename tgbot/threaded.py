@@ -0,0 +1,143 @@
+"""
+Рантайм бота на пуле потоков с полосами чатов: python telegram_bot.py threaded.
+
+Хендлеры telegram_bot — те же синхронные функции с ORM и TR-текстами —
+выполняются в ограниченном пуле потоков (BOT_THREADED_WORKERS). Апдейты
+раскладываются по полосам чатов: внутри чата порядок сохраняется, а медленный
+запрос или вызов Telegram в одном чате занимает один поток, а не весь процесс.
+Одновременно обрабатывается не больше BOT_THREADED_WORKERS апдейтов; число
+принятых, но не обработанных ограничено BOT_THREADED_MAX_PENDING.
+
+asyncio здесь только координирует полосы и long-poll getUpdates (AsyncTeleBot);
+запросы к БД и ответы в Telegram идут синхронно в потоках пула.
+
+Offset в getUpdates подтверждает только апдейты, обработанные без пропусков:
+при падении процесса Telegram доставит недообработанные заново. Чтобы при этом
+не повторить уже обработанные (идущие после незавершённого), они отмечаются в
+tgbot.dispatch.SeenUpdates и при повторной доставке пропускаются.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+from .dispatch import update_chat_id
+
+logger = logging.getLogger(__name__)
+
+
+class ThreadedRuntime:
+    def __init__(self, handle_update, workers=64, max_pending=1000, done=None):
+        self.handle_update = handle_update
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tg-bot")
+        self.max_pending = max_pending
+        self.done = done
+        self._lanes = {}
+        self._tasks = set()
+        self._in_flight = set()
+        self._last_id = None
+        # примитивы asyncio не привязаны к циклу до первого ожидания (Python 3.10+)
+        self._slots = asyncio.Semaphore(max_pending)
+        self._progress = asyncio.Event()
+
+    def _handle(self, update):
+        try:
+            self.handle_update(update)
+        except Exception:
+            logger.exception("update %s failed", getattr(update, "update_id", "?"))
+        finally:
+            if self.done is not None:
+                self.done.mark(update.update_id)
+            close_old_connections()
+
+    async def dispatch(self, update):
+        """Ставит апдейт в полосу его чата; ждёт, если в работе уже max_pending апдейтов."""
+        await self._slots.acquire()
+        self._in_flight.add(update.update_id)
+        chat_id = update_chat_id(update)
+        lane = self._lanes.get(chat_id)
+        if lane is not None:
+            lane.append(update)
+            return
+        self._lanes[chat_id] = deque([update])
+        task = asyncio.create_task(self._run_lane(chat_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_lane(self, chat_id):
+        loop = asyncio.get_running_loop()
+        lane = self._lanes[chat_id]
+        while lane:
+            update = lane.popleft()
+            try:
+                await loop.run_in_executor(self.executor, self._handle, update)
+            finally:
+                self._in_flight.discard(update.update_id)
+                self._slots.release()
+                self._progress.set()
+        del self._lanes[chat_id]
+
+    async def drain(self):
+        """Дожидается обработки всего, что уже принято."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    def ack_offset(self):
+        """offset для getUpdates: первый ещё не обработанный апдейт (или следующий за последним)."""
+        if self._in_flight:
+            return min(self._in_flight)
+        return None if self._last_id is None else self._last_id + 1
+
+    async def accept(self, updates):
+        """
+        Принимает ответ getUpdates. Возвращает False, если нового в нём нет:
+        Telegram вернул ещё не подтверждённые апдейты, которые уже в работе.
+        """
+        fresh = [u for u in updates if self._last_id is None or u.update_id > self._last_id]
+        for update in fresh:
+            self._last_id = update.update_id
+            if self.done is not None and self.done.seen(update.update_id):
+                # обработан до перезапуска, но offset не успели подтвердить
+                continue
+            await self.dispatch(update)
+        return bool(fresh) or not updates
+
+    async def poll(self, async_bot, timeout=25, limit=100):
+        while True:
+            self._progress.clear()
+            try:
+                updates = await async_bot.get_updates(offset=self.ack_offset(), limit=limit, timeout=timeout)
+            except Exception:
+                logger.exception("getUpdates failed")
+                await asyncio.sleep(3)
+                continue
+            if not await self.accept(updates) and self._in_flight:
+                # иначе getUpdates сразу вернёт те же апдейты — ждём, пока что-то обработается
+                await self._progress.wait()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def run(bot, token, workers=64, max_pending=1000, done=None):
+    """Запускает опрос; хендлеры — синхронного bot (без его собственного пула)."""
+    from telebot.async_telebot import AsyncTeleBot
+
+    bot.threaded = False
+    runtime = ThreadedRuntime(lambda update: bot.process_new_updates([update]), workers, max_pending, done)
+    async_bot = AsyncTeleBot(token)
+
+    async def main():
+        await async_bot.delete_webhook()
+        try:
+            await runtime.poll(async_bot)
+        finally:
+            await async_bot.close_session()
+
+    try:
+        asyncio.run(main())
+    finally:
+        runtime.close()
@@ -0,0 +1,137 @@
+"""
+Кэш пользователей бота по chat_id: горячие обработчики не ходят в БД
+за пользователем на каждое сообщение и нажатие кнопки.
+
+Записи живут BOT_USER_CACHE_TTL секунд. При сохранении/удалении пользователя
+в процессе бота они сбрасываются сразу, а правки из других процессов (веб,
+админка, другие воркеры вебхука) приходят событием {"user": id} из канала
+habits.events (start_invalidation_listener) — без HABITS_EVENTS_URL они
+видны только через TTL.
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+
+from habits import events
+
+logger = logging.getLogger(__name__)
+
+
+class UserCache:
+    """Ограниченный LRU-кэш с TTL; потокобезопасен (TeleBot обрабатывает апдейты в пуле потоков)."""
+
+    def __init__(self, maxsize=10_000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, chat_id):
+        with self._lock:
+            entry = self._data.get(chat_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.monotonic():
+                del self._data[chat_id]
+                return None
+            self._data.move_to_end(chat_id)
+            return user
+
+    def set(self, chat_id, user):
+        with self._lock:
+            self._data[chat_id] = (time.monotonic() + self.ttl, user)
+            self._data.move_to_end(chat_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, chat_id, loader):
+        user = self.get(chat_id)
+        if user is None:
+            user = loader(chat_id)
+            self.set(chat_id, user)
+        return user
+
+    def invalidate(self, chat_id=None, user_id=None):
+        with self._lock:
+            if chat_id is not None:
+                self._data.pop(chat_id, None)
+            if user_id is not None:
+                for key in [k for k, (_, u) in self._data.items() if u.pk == user_id]:
+                    del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def load_user_by_chat(chat_id: int):
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        username=str(chat_id),
+        defaults={"telegram_chat_id": chat_id, "language": "en"},
+    )
+    if getattr(user, "telegram_chat_id", None) != chat_id:
+        user.telegram_chat_id = chat_id
+        user.save(update_fields=["telegram_chat_id"])
+    # дефолт языка
+    if not getattr(user, "language", None):
+        user.language = "en"
+        user.save(update_fields=["language"])
+    return user
+
+
+user_cache = UserCache(maxsize=settings.BOT_USER_CACHE_SIZE, ttl=settings.BOT_USER_CACHE_TTL)
+
+
+def get_user_by_chat(chat_id: int):
+    return user_cache.get_or_load(chat_id, load_user_by_chat)
+
+
+def _invalidate_user(sender, instance, **kwargs):
+    user_cache.invalidate(chat_id=getattr(instance, "telegram_chat_id", None), user_id=instance.pk)
+
+
+post_save.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid="tgbot_user_cache_save")
+post_delete.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid="tgbot_user_cache_delete")
+
+
+_listener = None
+
+
+def start_invalidation_listener():
+    """
+    Фоновый поток: сбрасывает кэш пользователя по событию {"user": id} из
+    habits.events (их публикуют сигналы User в любом процессе). При обрыве
+    связи с Redis кэш очищается целиком — события за это время потеряны.
+    """
+    global _listener
+    if not settings.HABITS_EVENTS_URL or _listener is not None:
+        return
+
+    def listen():
+        while True:
+            try:
+                pubsub = events.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(events.CHANNEL)
+                user_cache.clear()
+                for message in pubsub.listen():
+                    user_id = json.loads(message["data"]).get("user")
+                    if user_id is not None:
+                        user_cache.invalidate(user_id=user_id)
+            except Exception:
+                logger.warning("user cache invalidation feed lost, reconnecting", exc_info=True)
+                time.sleep(5)
+
+    _listener = threading.Thread(target=listen, name="tgbot-user-cache", daemon=True)
+    _listener.start()
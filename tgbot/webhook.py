@@ -0,0 +1,138 @@
+"""
+Вебхук Telegram: альтернатива infinity_polling в telegram_bot.py.
+
+Telegram присылает апдейты POST-запросом на /telegram/webhook/ с секретом
+в заголовке X-Telegram-Bot-Api-Secret-Token. Вью проверяет секрет и
+обрабатывает апдейт существующими хендлерами бота прямо в запросе; 200
+уходит после обработки.
+
+Хендлеры не идемпотентны, поэтому каждый update_id обрабатывается не больше
+одного раза (tgbot.dispatch.SeenUpdates): повторная доставка отвечает 200
+без обработки. Ошибка хендлера пишется в лог и тоже отвечает 200 — повтор
+апдейта мог бы, например, создать привычку второй раз.
+
+Апдейты одного чата обрабатываются по одному — под блокировкой чата
+(tgbot.dispatch.ChatLocks), общей для всех воркеров gunicorn и реплик через
+Redis. Не дождались блокировки — 503, Telegram повторит позже. Порядок между
+одновременно пришедшими апдейтами одного чата задаёт Telegram: строгий порядок
+при нескольких соединениях не гарантирован, для него —
+TELEGRAM_WEBHOOK_MAX_CONNECTIONS=1.
+Регистрация вебхука: python telegram_bot.py set-webhook.
+"""
+
+import hmac
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .dispatch import ChatLocks, SeenUpdates, update_chat_id
+from .metrics import authorized, registry, start_log_summary
+from .users import start_invalidation_listener
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+_bot = None
+_chat_locks = None
+_seen_updates = None
+_init_lock = threading.Lock()
+
+
+def _load_bot():
+    """
+    Хендлеры telegram_bot; без BOT_TOKEN модуль делает SystemExit — в web это
+    ImproperlyConfigured (ответ 503), а не падение воркера.
+    """
+    global _bot
+    if _bot is None:
+        with _init_lock:
+            if _bot is None:
+                try:
+                    import telegram_bot
+                except SystemExit as exc:
+                    raise ImproperlyConfigured(f"telegram bot is not configured: {exc}") from None
+                # Хендлеры выполняются в потоке запроса, без собственного пула TeleBot.
+                telegram_bot.bot.threaded = False
+                start_log_summary(settings.BOT_METRICS_LOG_INTERVAL)
+                start_invalidation_listener()
+                _bot = telegram_bot.bot
+    return _bot
+
+
+def get_chat_locks() -> ChatLocks:
+    global _chat_locks
+    if _chat_locks is None:
+        with _init_lock:
+            if _chat_locks is None:
+                _chat_locks = ChatLocks(settings.BOT_STATE_URL, wait=settings.TELEGRAM_WEBHOOK_LOCK_WAIT)
+    return _chat_locks
+
+
+def get_seen_updates() -> SeenUpdates:
+    global _seen_updates
+    if _seen_updates is None:
+        with _init_lock:
+            if _seen_updates is None:
+                _seen_updates = SeenUpdates(settings.BOT_STATE_URL)
+    return _seen_updates
+
+
+def _unavailable(detail):
+    return JsonResponse({"detail": detail}, status=503, headers={"Retry-After": "5"})
+
+
+@csrf_exempt
+@require_POST
+def telegram_webhook(request):
+    secret = settings.TELEGRAM_WEBHOOK_SECRET
+    if not secret:
+        return JsonResponse({"detail": "Webhook mode is disabled."}, status=404)
+    if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+        return HttpResponseForbidden()
+
+    from telebot.types import Update
+
+    try:
+        update = Update.de_json(json.loads(request.body))
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"detail": "Invalid update."}, status=400)
+    try:
+        bot = _load_bot()
+    except ImproperlyConfigured:
+        logger.exception("webhook update %s rejected", update.update_id)
+        return _unavailable("Bot is not configured.")
+
+    with get_chat_locks().hold(update_chat_id(update)) as acquired:
+        if not acquired:
+            return _unavailable("Chat is busy.")
+        if not get_seen_updates().first_time(update.update_id):
+            logger.info("webhook update %s already processed, dropped", update.update_id)
+            return HttpResponse()
+        try:
+            bot.process_new_updates([update])
+        except Exception:
+            # апдейт уже отмечен: повтор от Telegram всё равно будет отброшен
+            logger.exception("webhook update %s failed", update.update_id)
+    return HttpResponse()
+
+
+def telegram_metrics(request):
+    """
+    Гистограммы хендлеров (tgbot.metrics) в формате Prometheus — только этого
+    воркера web, то есть апдейтов вебхука, которые он обработал сам. Полная
+    картина — лишь при одном воркере; бот в режиме polling отдаёт свои метрики
+    на BOT_METRICS_PORT.
+    """
+    token = settings.BOT_METRICS_TOKEN
+    if not token:
+        return JsonResponse({"detail": "Metrics are disabled."}, status=404)
+    if not authorized(request.headers.get("Authorization"), token):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render_prometheus(), content_type="text/plain; version=0.0.4")